@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script para (re)calcular a tabela resumo_diario a partir de jogos, saques e
+usuários. Sem datas, refaz todo o histórico.
+
+Uso: python backfill_resumo_diario.py [--inicio YYYY-MM-DD] [--fim YYYY-MM-DD]
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+from init_db import create_app
+from src.models.user import db
+from src.services import resumo_diario
+
+def parse_data(valor):
+    return datetime.strptime(valor, "%Y-%m-%d").date()
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula o resumo diário")
+    parser.add_argument("--inicio", type=parse_data, help="Primeiro dia (inclusive)")
+    parser.add_argument("--fim", type=parse_data, help="Último dia (inclusive)")
+    args = parser.parse_args()
+    fim = args.fim + timedelta(days=1) if args.fim else None
+    
+    app = create_app()
+    with app.app_context():
+        try:
+            db.create_all()
+            dias = resumo_diario.recalcular(args.inicio, fim)
+            db.session.commit()
+            print(f"✓ Resumo diário recalculado: {dias} dia(s) corrigido(s)")
+        except Exception as e:
+            print(f"❌ Erro ao recalcular resumo diário: {e}")
+            db.session.rollback()
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
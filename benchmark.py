@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark dos principais endpoints da API (compra, login, histórico e
+relatórios do admin).
+
+Sobe o src.main:app em processo, popula uma base própria com volume
+realista (usuários, jogos, raspadinhas e saques) e mede, para cada
+endpoint, requisições por segundo, latência p50/p99 e consultas SQL por
+requisição. O resultado é gravado em JSON e pode ser comparado com um
+baseline: o script termina com código 1 se houver regressão.
+
+Uso:
+    python benchmark.py [--banco URL] [--usuarios 500] [--jogos 200000]
+                        [--requisicoes 200] [--threads 1]
+                        [--saida resultado.json] [--baseline benchmark_baseline.json]
+
+Por padrão usa um SQLite em /tmp; para resultados próximos da produção
+aponte --banco (ou BENCH_DATABASE_URL) para um PostgreSQL descartável.
+A carga só é feita quando a base ainda não tem os usuários do benchmark.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import jwt
+from sqlalchemy import event, func, insert
+from sqlalchemy.engine import Engine
+
+SENHA_BENCH = 'bench123'
+EMAIL_BENCH = 'bench{}@bench.local'
+TAMANHO_BLOCO = 10000
+# Folga na contagem de consultas: a verificação periódica das configurações
+# acrescenta uma consulta a cada poucos segundos
+FOLGA_CONSULTAS = 0.1
+DIAS_HISTORICO = 90
+
+_contador = threading.local()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _contar_consulta(conn, cursor, statement, parameters, context, executemany):
+    _contador.consultas = getattr(_contador, 'consultas', 0) + 1
+
+def _inserir_em_blocos(db, tabela, linhas):
+    for i in range(0, len(linhas), TAMANHO_BLOCO):
+        db.session.execute(insert(tabela), linhas[i:i + TAMANHO_BLOCO])
+
+def popular_base(app, args):
+    """Carrega usuários, jogos, raspadinhas e saques de forma determinística"""
+    from src.models.user import db, User, Jogo, Raspadinha, Saque
+    from src.services import estatisticas, resumo_diario, resultado_compacto, senhas
+    from src.services.sorteio import TABELA_PADRAO, sortear_raspadinhas
+    from src.routes.jogos import ARMAZENAMENTO_COMPACTO, VALOR_RASPADINHA_PADRAO
+
+    with app.app_context():
+        if User.query.filter_by(email=EMAIL_BENCH.format(0)).first():
+            print("✓ Base já populada, pulando a carga")
+            return
+
+        rng = random.Random(args.semente)
+        agora = datetime.utcnow()
+        inicio = time.perf_counter()
+
+        # Um único hash para todos: gerar milhares de hashes dominaria a carga
+        hash_senha = senhas.gerar_hash(SENHA_BENCH)
+        usuarios = [{
+            'nome': f'Usuário {i}',
+            'email': EMAIL_BENCH.format(i),
+            'telefone': '(11) 90000-0000',
+            'password_hash': hash_senha,
+            'saldo': Decimal('1000000.00'),
+            'data_cadastro': agora - timedelta(days=rng.randint(0, DIAS_HISTORICO)),
+            'referral_code': f'bench-{i}',
+        } for i in range(args.usuarios)]
+        admin_email = os.getenv('ADMIN_EMAIL', 'admin@raspadinha.com')
+        if not User.query.filter_by(email=admin_email).first():
+            usuarios.append(dict(usuarios[0], nome='Administrador', email=admin_email, referral_code='bench-admin'))
+        _inserir_em_blocos(db, User.__table__, usuarios)
+        ids_usuarios = [uid for (uid,) in db.session.query(User.id).filter(User.email.like('%@bench.local'))]
+
+        proximo_jogo = (db.session.query(func.max(Jogo.id)).scalar() or 0) + 1
+        jogos, raspadinhas, saques = [], [], []
+        for n in range(args.jogos):
+            jogo_id = proximo_jogo + n
+            quantidade = rng.randint(1, args.raspadinhas_por_jogo * 2 - 1)
+            sorteio = sortear_raspadinhas(quantidade, TABELA_PADRAO, rng.getrandbits(63))
+            jogo = {
+                'id': jogo_id,
+                'user_id': rng.choice(ids_usuarios),
+                'quantidade_raspadinhas': quantidade,
+                'valor_total': VALOR_RASPADINHA_PADRAO * quantidade,
+                'premio_total': sorteio.premio_total,
+                'data_jogo': agora - timedelta(seconds=rng.randint(0, DIAS_HISTORICO * 86400)),
+                'origem_saldo': True,
+                'usou_bonus': False,
+                'semente': sorteio.semente,
+                'resultado_compacto': None,
+            }
+            if ARMAZENAMENTO_COMPACTO:
+                jogo['resultado_compacto'] = resultado_compacto.codificar(sorteio.premios, sorteio.extras)
+            else:
+                raspadinhas.extend(
+                    {'jogo_id': jogo_id, 'premio': premio, 'extra': extra}
+                    for premio, extra in zip(sorteio.premios, sorteio.extras)
+                )
+            jogos.append(jogo)
+            if rng.random() < 0.02:
+                # Só estados que a aplicação produz (ver src/services/saques.py)
+                status = rng.choice(['pendente', 'concluido', 'concluido', 'cancelado'])
+                saques.append({
+                    'user_id': jogo['user_id'],
+                    'valor': Decimal(rng.randint(10, 500)),
+                    'chave_pix': 'bench@pix',
+                    'status': status,
+                    'data_solicitacao': jogo['data_jogo'],
+                    'data_processamento': None if status == 'pendente' else jogo['data_jogo'],
+                })
+            if len(jogos) >= TAMANHO_BLOCO:
+                _inserir_em_blocos(db, Jogo.__table__, jogos)
+                _inserir_em_blocos(db, Raspadinha.__table__, raspadinhas)
+                jogos, raspadinhas = [], []
+        _inserir_em_blocos(db, Jogo.__table__, jogos)
+        _inserir_em_blocos(db, Raspadinha.__table__, raspadinhas)
+        _inserir_em_blocos(db, Saque.__table__, saques)
+
+        estatisticas.recalcular()
+        resumo_diario.recalcular()
+        db.session.commit()
+        print(f"✓ Base populada em {time.perf_counter() - inicio:.1f}s: "
+              f"{args.usuarios} usuários, {args.jogos} jogos")
+
+def _token(user_id, email, segredo):
+    return jwt.encode(
+        {"user_id": user_id, "email": email, "exp": datetime.utcnow().timestamp() + 86400},
+        segredo,
+        algorithm="HS256"
+    )
+
+def montar_cenarios(app, args):
+    """Retorna {nome: função(rng) -> kwargs do test client}"""
+    from src.models.user import User
+    from src.routes.auth import SECRET_KEY
+
+    with app.app_context():
+        usuarios = [(u.id, u.email) for u in User.query.filter(User.email.like('%@bench.local')).limit(200)]
+        admin_email = os.getenv('ADMIN_EMAIL', 'admin@raspadinha.com')
+        admin = User.query.filter_by(email=admin_email).first()
+        admin = (admin.id, admin.email)
+
+    tokens = {uid: {'Authorization': 'Bearer ' + _token(uid, email, SECRET_KEY)} for uid, email in usuarios}
+    admin_headers = {'Authorization': 'Bearer ' + _token(admin[0], admin[1], SECRET_KEY)}
+
+    def usuario(rng):
+        return tokens[rng.choice(usuarios)[0]]
+
+    def get(url, headers):
+        return lambda rng: {'method': 'GET', 'path': url, 'headers': headers(rng)}
+
+    etags = {}
+    def revalidar(gerador):
+        # Polling sem mudanças: mesma requisição com o If-None-Match da resposta atual
+        def gerar(rng):
+            kwargs = gerador(rng)
+            chave = (kwargs['path'], kwargs['headers']['Authorization'])
+            if chave not in etags:
+                etags[chave] = app.test_client().open(**kwargs).headers.get('ETag', '')
+            return {**kwargs, 'headers': {**kwargs['headers'], 'If-None-Match': etags[chave]}}
+        return gerar
+
+    return {
+        'auth.login': lambda rng: {
+            'method': 'POST', 'path': '/api/auth/login',
+            'json': {'email': rng.choice(usuarios)[1], 'password': SENHA_BENCH},
+        },
+        'auth.profile': get('/api/auth/profile', usuario),
+        'jogos.novo': lambda rng: {
+            'method': 'POST', 'path': '/api/jogos/novo', 'headers': usuario(rng),
+            'json': {'quantidade_raspadinhas': args.raspadinhas_por_jogo, 'origem_saldo': True},
+        },
+        'jogos.historico': get('/api/jogos/historico', usuario),
+        'jogos.historico_resumo': get('/api/jogos/historico?detalhes=false', usuario),
+        'jogos.saques': get('/api/jogos/saques', usuario),
+        'admin.dashboard': get('/api/admin/dashboard', lambda rng: admin_headers),
+        'admin.usuarios': get('/api/admin/usuarios', lambda rng: admin_headers),
+        'admin.jogos': get('/api/admin/jogos', lambda rng: admin_headers),
+        'admin.saques': get('/api/admin/saques', lambda rng: admin_headers),
+        'admin.relatorio_financeiro': get('/api/admin/relatorios/financeiro', lambda rng: admin_headers),
+        'admin.partner_usage': get('/api/admin/reports/partner-usage', lambda rng: admin_headers),
+        'auth.profile_304': revalidar(get('/api/auth/profile', usuario)),
+        'jogos.historico_304': revalidar(get('/api/jogos/historico', usuario)),
+        'jogos.saques_304': revalidar(get('/api/jogos/saques', usuario)),
+    }
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def medir(app, gerador, requisicoes, threads, aquecimento, semente):
+    """Executa o cenário e devolve rps, p50/p99 (ms), consultas/requisição e erros"""
+    from src.services import autenticacao
+
+    # Cada cenário começa com os caches do worker vazios, para que a contagem
+    # de consultas não dependa da ordem de execução
+    autenticacao.tokens_cache.limpar()
+    autenticacao.usuarios_cache.limpar()
+
+    rng = random.Random(semente)
+    pedidos = [gerador(rng) for _ in range(aquecimento + requisicoes)]
+
+    def executar(kwargs):
+        cliente = app.test_client()
+        _contador.consultas = 0
+        inicio = time.perf_counter()
+        resposta = cliente.open(**kwargs)
+        duracao = time.perf_counter() - inicio
+        return duracao, _contador.consultas, resposta.status_code
+
+    for kwargs in pedidos[:aquecimento]:
+        executar(kwargs)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        resultados = list(executor.map(executar, pedidos[aquecimento:]))
+    total = time.perf_counter() - inicio
+
+    latencias = [r[0] * 1000 for r in resultados]
+    return {
+        'rps': round(requisicoes / total, 1),
+        'p50_ms': round(percentil(latencias, 50), 2),
+        'p99_ms': round(percentil(latencias, 99), 2),
+        'consultas_por_requisicao': round(sum(r[1] for r in resultados) / requisicoes, 2),
+        'erros': sum(1 for r in resultados if r[2] >= 400),
+    }
+
+def comparar(resultado, baseline, tolerancia):
+    """Lista as regressões em relação ao baseline"""
+    regressoes = []
+    for nome, base in baseline['cenarios'].items():
+        atual = resultado['cenarios'].get(nome)
+        if atual is None:
+            continue
+        if atual['consultas_por_requisicao'] > base['consultas_por_requisicao'] + FOLGA_CONSULTAS:
+            regressoes.append(f"{nome}: consultas/req {base['consultas_por_requisicao']} -> {atual['consultas_por_requisicao']}")
+        if atual['rps'] < base['rps'] * (1 - tolerancia):
+            regressoes.append(f"{nome}: rps {base['rps']} -> {atual['rps']}")
+        if atual['p99_ms'] > base['p99_ms'] * (1 + tolerancia):
+            regressoes.append(f"{nome}: p99 {base['p99_ms']}ms -> {atual['p99_ms']}ms")
+        if atual['erros'] > base['erros']:
+            regressoes.append(f"{nome}: erros {base['erros']} -> {atual['erros']}")
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos endpoints da API")
+    parser.add_argument("--banco", default=os.getenv('BENCH_DATABASE_URL', 'sqlite:////tmp/raspadinha_bench.sqlite'),
+                        help="URL do banco descartável usado no benchmark")
+    parser.add_argument("--usuarios", type=int, default=500, help="Usuários criados na carga")
+    parser.add_argument("--jogos", type=int, default=200000, help="Jogos criados na carga")
+    parser.add_argument("--raspadinhas-por-jogo", type=int, default=5, help="Média de raspadinhas por jogo")
+    parser.add_argument("--requisicoes", type=int, default=200, help="Requisições medidas por cenário")
+    parser.add_argument("--aquecimento", type=int, default=20, help="Requisições descartadas antes da medição")
+    parser.add_argument("--threads", type=int, default=1, help="Requisições simultâneas")
+    parser.add_argument("--cenarios", help="Lista separada por vírgulas (padrão: todos)")
+    parser.add_argument("--semente", type=int, default=42, help="Semente da carga e da escolha de usuários")
+    parser.add_argument("--saida", help="Arquivo JSON com o resultado")
+    parser.add_argument("--baseline", help="Resultado anterior para comparação")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Piora relativa aceita em rps e p99")
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.banco
+    from src.main import app
+
+    popular_base(app, args)
+    cenarios = montar_cenarios(app, args)
+    if args.cenarios:
+        cenarios = {nome: cenarios[nome] for nome in args.cenarios.split(',')}
+
+    resultado = {
+        'meta': {
+            'data': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'banco': args.banco.split(':', 1)[0],
+            'usuarios': args.usuarios,
+            'jogos': args.jogos,
+            'raspadinhas_por_jogo': args.raspadinhas_por_jogo,
+            'requisicoes': args.requisicoes,
+            'threads': args.threads,
+        },
+        'cenarios': {},
+    }
+
+    print(f"{'cenário':<32}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'consultas':>11}{'erros':>7}")
+    for nome, gerador in cenarios.items():
+        r = medir(app, gerador, args.requisicoes, args.threads, args.aquecimento, args.semente)
+        resultado['cenarios'][nome] = r
+        print(f"{nome:<32}{r['rps']:>9}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['consultas_por_requisicao']:>11}{r['erros']:>7}")
+
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f"✓ Resultado gravado em {args.saida}")
+
+    if args.baseline:
+        with open(args.baseline) as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print("❌ Regressões em relação ao baseline:")
+            for linha in regressoes:
+                print(f"  - {linha}")
+            sys.exit(1)
+        print("✓ Sem regressões em relação ao baseline")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script para gerar livros de bilhetes grandes fora de uma requisição HTTP
+(a rota do admin aceita até MAX_BILHETES_POR_REQUISICAO bilhetes).
+
+Sem --tabela, usa a tabela de prêmios configurada no banco.
+
+Uso: python gerar_ticket_book.py --total 5000000 [--tabela tabela.json] [--inativo]
+"""
+
+import argparse
+import json
+import sys
+from init_db import create_app
+from src.models.user import db
+from src.services.sorteio import carregar_tabela_premios, montar_tabela
+from src.services.ticket_book import criar_livro, MAX_BILHETES_POR_LIVRO
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um livro de bilhetes pré-gerado")
+    parser.add_argument("--total", type=int, required=True, help=f"Quantidade de bilhetes (até {MAX_BILHETES_POR_LIVRO})")
+    parser.add_argument("--tabela", help="Arquivo JSON com premios, pesos e chance_extra")
+    parser.add_argument("--inativo", action="store_true", help="Cria o livro desativado")
+    args = parser.parse_args()
+    if not 0 < args.total <= MAX_BILHETES_POR_LIVRO:
+        parser.error(f"--total deve estar entre 1 e {MAX_BILHETES_POR_LIVRO}")
+    
+    app = create_app()
+    with app.app_context():
+        try:
+            if args.tabela:
+                with open(args.tabela, encoding="utf-8") as arquivo:
+                    tabela = montar_tabela(json.load(arquivo))
+            else:
+                tabela = carregar_tabela_premios()
+            livro = criar_livro(args.total, tabela)
+            livro.ativo = not args.inativo
+            db.session.commit()
+            print(f"✓ Livro {livro.id} criado: {livro.total} bilhetes, prêmio total R$ {livro.premio_total}")
+        except Exception as e:
+            print(f"❌ Erro ao gerar livro de bilhetes: {e}")
+            db.session.rollback()
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -6,8 +6,11 @@ Script para inicializar o banco de dados
 
 import os
 import sys
+import json
 from flask import Flask
 from src.models.user import db, User, PartnerCoupon, Configuracao
+from src.services.sorteio import TABELA_PREMIOS_PADRAO
+from src.services import estatisticas, resumo_diario
 from werkzeug.security import generate_password_hash
 
 def create_app():
@@ -61,7 +64,8 @@ def init_database():
                 {'chave': 'pix_enabled', 'valor': 'true', 'descricao': 'Habilitar pagamento via PIX'},
                 {'chave': 'card_enabled', 'valor': 'false', 'descricao': 'Habilitar pagamento via cartão'},
                 {'chave': 'pix_key', 'valor': '', 'descricao': 'Chave PIX principal para recebimentos'},
-                {'chave': 'card_api_key', 'valor': '', 'descricao': 'Chave da API do processador de cartão'}
+                {'chave': 'card_api_key', 'valor': '', 'descricao': 'Chave da API do processador de cartão'},
+                {'chave': 'tabela_premios', 'valor': json.dumps(TABELA_PREMIOS_PADRAO), 'descricao': 'Prêmios, pesos e chance de raspadinha extra usados no sorteio'}
             ]
             
             for config_data in configuracoes_padrao:
@@ -85,6 +89,13 @@ def init_database():
                     db.session.add(cupom)
                     print(f"✓ Cupom '{cupom_data['code']}' criado!")
             
+            # Recalcular os totais do dashboard
+            db.session.flush()
+            estatisticas.recalcular()
+            print("✓ Totais do dashboard recalculados!")
+            resumo_diario.recalcular()
+            print("✓ Resumo diário recalculado!")
+            
             # Salvar todas as alterações
             db.session.commit()
             print("\n✅ Banco de dados inicializado com sucesso!")
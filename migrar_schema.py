@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script para atualizar o schema de um banco já existente.
+
+O db.create_all() só cria tabelas que ainda não existem; colunas e índices
+novos em tabelas antigas precisam de ALTER TABLE / CREATE INDEX. Este script
+compara os modelos com o banco, cria as tabelas que faltam e adiciona as
+colunas e índices ausentes. Na primeira execução também calcula o resumo
+diário a partir do histórico (jogos, saques e usuários anteriores ao
+deploy), sem o qual o relatório financeiro só mostraria o que veio depois.
+Pode ser executado mais de uma vez.
+
+Uso: python migrar_schema.py [--sql]
+"""
+
+import argparse
+import sys
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from init_db import create_app
+from src.models.user import db
+from src.services import resumo_diario
+
+def comando_coluna(coluna, dialeto):
+    ddl = str(CreateColumn(coluna).compile(dialect=dialeto))
+    # Chaves estrangeiras de uma coluna vão junto no ADD COLUMN
+    for fk in coluna.foreign_keys:
+        alvo = fk.column
+        ddl += f" REFERENCES {alvo.table.name} ({alvo.name})"
+    return f"ALTER TABLE {coluna.table.name} ADD COLUMN {ddl}"
+
+def comandos_pendentes(conexao):
+    """ALTER TABLE / CREATE INDEX que faltam nas tabelas já existentes"""
+    inspetor = inspect(conexao)
+    dialeto = conexao.dialect
+    tabelas_existentes = set(inspetor.get_table_names())
+    comandos = []
+    for tabela in db.metadata.sorted_tables:
+        if tabela.name not in tabelas_existentes:
+            continue  # criada inteira pelo create_all
+        colunas = {c['name'] for c in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name not in colunas:
+                comandos.append(comando_coluna(coluna, dialeto))
+        indices = {i['name'] for i in inspetor.get_indexes(tabela.name)}
+        for indice in sorted(tabela.indexes, key=lambda i: i.name):
+            if indice.name not in indices:
+                comandos.append(str(CreateIndex(indice).compile(dialect=dialeto)))
+    return comandos
+
+def main():
+    parser = argparse.ArgumentParser(description="Adiciona tabelas, colunas e índices novos ao banco")
+    parser.add_argument("--sql", action="store_true", help="Apenas mostra os comandos, sem executar")
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        try:
+            if not args.sql:
+                # Tabelas novas primeiro: colunas novas podem referenciá-las
+                db.create_all()
+            with db.engine.begin() as conexao:
+                comandos = comandos_pendentes(conexao)
+                for comando in comandos:
+                    print(f"{comando};")
+                    if not args.sql:
+                        conexao.execute(text(comando))
+            if args.sql:
+                print("-- Depois do schema, calcule o resumo diário: python backfill_resumo_diario.py")
+                return
+            print(f"✓ Schema atualizado: {len(comandos)} comando(s) executado(s)")
+            if not resumo_diario.calculado():
+                dias = resumo_diario.recalcular()
+                db.session.commit()
+                print(f"✓ Resumo diário calculado: {dias} dia(s) corrigido(s)")
+        except Exception as e:
+            print(f"❌ Erro ao atualizar schema: {e}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
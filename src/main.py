@@ -9,10 +9,16 @@ from src.models.user import db
 from src.routes.auth import auth_bp
 from src.routes.jogos import jogos_bp
 from src.routes.admin import admin_bp
+from src.services.replica import BIND_REPLICA
+from src.services import metricas, perfilador
+from src.services.serializacao import ProvedorJSON
 import os
 
 app = Flask(__name__, static_folder='static')
 
+# Respostas JSON com orjson quando instalado (ver src/services/serializacao.py)
+app.json = ProvedorJSON(app)
+
 # Configuração CORS
 CORS(app, origins="*", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 
@@ -30,6 +36,21 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Pool de conexões (valores opcionais via ambiente)
+engine_options = {
+    'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+}
+for opcao, variavel in [('pool_size', 'DB_POOL_SIZE'), ('max_overflow', 'DB_MAX_OVERFLOW'), ('pool_timeout', 'DB_POOL_TIMEOUT')]:
+    if os.getenv(variavel):
+        engine_options[opcao] = int(os.getenv(variavel))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+# Réplica de leitura opcional para relatórios e históricos (ver src/services/replica.py)
+replica_url = os.getenv('DATABASE_REPLICA_URL')
+if replica_url:
+    app.config['SQLALCHEMY_BINDS'] = {BIND_REPLICA: replica_url}
+
 # Inicializar o banco de dados
 db.init_app(app)
 
@@ -38,6 +59,12 @@ app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(jogos_bp, url_prefix='/api/jogos')
 app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
+# Consultas, tempo no banco e tempo total por endpoint (ver src/services/metricas.py)
+metricas.instalar(app)
+
+# Amostragem de pilha e consultas lentas, opcional (PERFIL_ATIVO=true)
+perfilador.instalar(app)
+
 # Rota para servir arquivos estáticos
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
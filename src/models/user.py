@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
 
-db = SQLAlchemy()
+from src.services import resultado_compacto, senhas
+from src.services.replica import SessaoRoteada
+
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -15,7 +17,7 @@ class User(db.Model):
     telefone = db.Column(db.String(20), nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
     saldo = db.Column(db.Numeric(10, 2), default=0.0)
-    data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
+    data_cadastro = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     ultimo_login = db.Column(db.DateTime, nullable=True)
     
     # Campos para Sistema de Indicação de Usuários
@@ -39,11 +41,16 @@ class User(db.Model):
             self.referral_code = str(uuid.uuid4())
             
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = senhas.gerar_hash(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return senhas.verificar(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return senhas.precisa_rehash(self.password_hash)
     
+    # Alterações de saldo persistidas devem usar src/services/saldo.py, que
+    # faz o débito/crédito atômico no banco e registra o extrato.
     def add_saldo(self, valor):
         self.saldo = (self.saldo or 0) + valor
         
@@ -62,6 +69,7 @@ class User(db.Model):
             return True
         return False
 
+    # Mesmos campos de PLANO_USUARIO (src/services/serializacao.py), usado nas listagens
     def to_dict(self):
         return {
             'id': self.id,
@@ -95,25 +103,74 @@ class PartnerCoupon(db.Model):
             'description': self.description,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
             'is_active': self.is_active,
-            'usage_count': self.usage_count
+            'usage_count': self.total_usos
         }
+    
+    @property
+    def total_usos(self):
+        # Contagem base (histórica) + usos registrados nos shards
+        return (self.usage_count or 0) + (self.usos_shards or 0)
+
+class PartnerCouponUsageShard(db.Model):
+    """Contador de usos de um cupom dividido em shards.
+
+    Cada cadastro incrementa um shard sorteado, então cadastros simultâneos
+    com o mesmo cupom não disputam a mesma linha.
+    """
+    __tablename__ = 'partner_coupon_usage_shards'
+    
+    coupon_id = db.Column(db.Integer, db.ForeignKey('partner_coupons.id', ondelete='CASCADE'), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+PartnerCoupon.usos_shards = db.column_property(
+    db.select(db.func.coalesce(db.func.sum(PartnerCouponUsageShard.count), 0))
+    .where(PartnerCouponUsageShard.coupon_id == PartnerCoupon.id)
+    .correlate_except(PartnerCouponUsageShard)
+    .scalar_subquery()
+)
 
 class Jogo(db.Model):
     __tablename__ = 'jogos'
+    __table_args__ = (
+        # Histórico por usuário paginado por (data_jogo, id)
+        db.Index('ix_jogos_user_id_data_jogo', 'user_id', 'data_jogo', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     quantidade_raspadinhas = db.Column(db.Integer, nullable=False)
     valor_total = db.Column(db.Numeric(10, 2), nullable=False)
     premio_total = db.Column(db.Numeric(10, 2), nullable=False)
-    data_jogo = db.Column(db.DateTime, default=datetime.utcnow)
+    data_jogo = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     origem_saldo = db.Column(db.Boolean, default=False)
     usou_bonus = db.Column(db.Boolean, default=False)
+    # Semente do sorteio no servidor (permite reproduzir o resultado do jogo)
+    semente = db.Column(db.BigInteger, nullable=True)
+    # Bilhetes retirados de um livro pré-gerado (quando houver livro ativo)
+    ticket_book_id = db.Column(db.Integer, db.ForeignKey('ticket_books.id'), nullable=True)
+    ticket_inicio = db.Column(db.Integer, nullable=True)
+    # Resultados empacotados (modo compacto); quando preenchido, o jogo não
+    # tem linhas em `raspadinhas` (ver src/services/resultado_compacto.py)
+    resultado_compacto = db.Column(db.LargeBinary, nullable=True)
     
     # Relacionamentos
     raspadinhas = db.relationship('Raspadinha', backref='jogo', lazy=True)
     
-    def to_dict(self):
+    # Mesmos campos de PLANO_JOGO (src/services/serializacao.py), usado nas listagens
+    def to_dict(self, raspadinhas=None, incluir_raspadinhas=True):
+        # `raspadinhas` permite montar a resposta com dados já em memória,
+        # sem recarregar o relacionamento do banco
+        if not incluir_raspadinhas:
+            raspadinhas = None
+        elif raspadinhas is None:
+            if self.resultado_compacto is not None:
+                raspadinhas = [
+                    {'id': None, 'jogo_id': self.id, 'premio': float(premio), 'extra': extra}
+                    for premio, extra in resultado_compacto.decodificar(self.resultado_compacto)
+                ]
+            else:
+                raspadinhas = [r.to_dict() for r in self.raspadinhas]
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -123,17 +180,20 @@ class Jogo(db.Model):
             'data_jogo': self.data_jogo.strftime('%Y-%m-%d %H:%M:%S'),
             'origem_saldo': self.origem_saldo,
             'usou_bonus': self.usou_bonus,
-            'raspadinhas': [r.to_dict() for r in self.raspadinhas]
+            'semente': str(self.semente) if self.semente is not None else None,
+            'ticket_book_id': self.ticket_book_id,
+            **({'raspadinhas': raspadinhas} if incluir_raspadinhas else {})
         }
 
 class Raspadinha(db.Model):
     __tablename__ = 'raspadinhas'
     
     id = db.Column(db.Integer, primary_key=True)
-    jogo_id = db.Column(db.Integer, db.ForeignKey('jogos.id'), nullable=False)
+    jogo_id = db.Column(db.Integer, db.ForeignKey('jogos.id'), nullable=False, index=True)
     premio = db.Column(db.Numeric(10, 2), nullable=False)
     extra = db.Column(db.Boolean, default=False)
     
+    # Mesmos campos de PLANO_RASPADINHA (src/services/serializacao.py), usado nas listagens
     def to_dict(self):
         return {
             'id': self.id,
@@ -142,17 +202,58 @@ class Raspadinha(db.Model):
             'extra': self.extra
         }
 
+class TicketBook(db.Model):
+    """Livro de bilhetes pré-gerado com pagamento total fixo.
+
+    Cada bilhete ocupa um byte em `bilhetes`: os 7 bits baixos são o índice
+    do prêmio em `tabela_premios` e o bit alto indica raspadinha extra.
+    `cursor` aponta para o próximo bilhete ainda não vendido.
+    """
+    __tablename__ = 'ticket_books'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False)
+    cursor = db.Column(db.Integer, nullable=False, default=0)
+    tabela_premios = db.Column(db.Text, nullable=False)
+    premio_total = db.Column(db.Numeric(14, 2), nullable=False)
+    semente = db.Column(db.BigInteger, nullable=False)
+    bilhetes = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    ativo = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'total': self.total,
+            'vendidos': self.cursor,
+            'restantes': self.total - self.cursor,
+            'premio_total': float(self.premio_total),
+            'ativo': self.ativo,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
 class Saque(db.Model):
     __tablename__ = 'saques'
+    __table_args__ = (
+        # Saques do usuário por data e carimbo de versão do ETag
+        db.Index('ix_saques_user_id_data_solicitacao', 'user_id', 'data_solicitacao'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     valor = db.Column(db.Numeric(10, 2), nullable=False)
     chave_pix = db.Column(db.String(100), nullable=False)
     status = db.Column(db.String(20), default='pendente')
-    data_solicitacao = db.Column(db.DateTime, default=datetime.utcnow)
-    data_processamento = db.Column(db.DateTime, nullable=True)
+    data_solicitacao = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    data_processamento = db.Column(db.DateTime, nullable=True, index=True)
+    # Controle da fila de pagamento (worker_saques.py)
+    bloqueado_ate = db.Column(db.DateTime, nullable=True)
+    tentativas = db.Column(db.Integer, default=0, server_default='0')
+    ultimo_erro = db.Column(db.String(255), nullable=True)
+    # Incrementada em todo UPDATE (ORM ou em lote); compõe o ETag dos saques do usuário
+    versao = db.Column(db.Integer, nullable=False, default=0, server_default='0', onupdate=db.text('coalesce(versao, 0) + 1'))
     
+    # Mesmos campos de PLANO_SAQUE (src/services/serializacao.py), usado nas listagens
     def to_dict(self):
         return {
             'id': self.id,
@@ -164,6 +265,94 @@ class Saque(db.Model):
             'data_processamento': self.data_processamento.strftime('%Y-%m-%d %H:%M:%S') if self.data_processamento else None
         }
 
+class Movimentacao(db.Model):
+    """Lançamento imutável do extrato de saldo (valor positivo = crédito)"""
+    __tablename__ = 'ledger'
+    __table_args__ = (
+        db.Index('ix_ledger_user_id_id', 'user_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    tipo = db.Column(db.String(20), nullable=False)
+    valor = db.Column(db.Numeric(10, 2), nullable=False)
+    saldo_apos = db.Column(db.Numeric(10, 2), nullable=False)
+    referencia = db.Column(db.String(50), nullable=True)
+    data_movimentacao = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'tipo': self.tipo,
+            'valor': float(self.valor),
+            'saldo_apos': float(self.saldo_apos),
+            'referencia': self.referencia,
+            'data_movimentacao': self.data_movimentacao.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+class ChaveIdempotencia(db.Model):
+    """Resposta gravada para um cabeçalho Idempotency-Key já processado"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'chave', name='uq_idempotency_keys_user_chave'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    chave = db.Column(db.String(100), nullable=False)
+    rota = db.Column(db.String(50), nullable=False)
+    # sha256 do corpo da requisição original
+    impressao = db.Column(db.String(64), nullable=True)
+    # Nulo enquanto a requisição original ainda está em processamento
+    status_code = db.Column(db.Integer, nullable=True)
+    resposta = db.Column(db.Text, nullable=True)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Estatisticas(db.Model):
+    """Totais acumulados do dashboard, divididos em shards.
+
+    Cada escrita incrementa um shard sorteado (evitando disputa por uma única
+    linha); o dashboard soma os poucos shards existentes.
+    """
+    __tablename__ = 'estatisticas'
+    
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_usuarios = db.Column(db.Integer, nullable=False, default=0)
+    total_jogos = db.Column(db.Integer, nullable=False, default=0)
+    total_arrecadado = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_premios = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    saques_pendentes = db.Column(db.Integer, nullable=False, default=0)
+    valor_saques_pendentes = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_cupons_ativos = db.Column(db.Integer, nullable=False, default=0)
+    total_cadastros_cupom = db.Column(db.Integer, nullable=False, default=0)
+
+class ResumoDiario(db.Model):
+    """Totais financeiros e operacionais por dia (UTC), divididos em shards"""
+    __tablename__ = 'resumo_diario'
+    
+    dia = db.Column(db.Date, primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_arrecadado = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_premios = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    quantidade_jogos = db.Column(db.Integer, nullable=False, default=0)
+    quantidade_raspadinhas = db.Column(db.Integer, nullable=False, default=0)
+    saques_solicitados = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    saques_concluidos = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    novos_usuarios = db.Column(db.Integer, nullable=False, default=0)
+
+class VersaoTabela(db.Model):
+    """Contador de versão de um conjunto de dados.
+
+    A linha ('configuracoes', 0) guarda a última versão gravada em
+    Configuracao (ver src/services/configuracoes.py).
+    """
+    __tablename__ = 'versoes_tabelas'
+    
+    nome = db.Column(db.String(50), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    versao = db.Column(db.BigInteger, nullable=False, default=0)
+
 class Configuracao(db.Model):
     __tablename__ = 'configuracoes'
     
@@ -171,6 +360,8 @@ class Configuracao(db.Model):
     chave = db.Column(db.String(50), unique=True, nullable=False)
     valor = db.Column(db.String(255), nullable=False)
     descricao = db.Column(db.String(255), nullable=True)
+    # Incrementada a cada alteração para invalidar o cache dos workers
+    versao = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     def to_dict(self):
         return {
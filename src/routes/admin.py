@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
-from flask import Blueprint, request, jsonify
-from src.models.user import db, User, Jogo, Raspadinha, Saque, Configuracao, PartnerCoupon # Import PartnerCoupon
-from src.routes.auth import token_required
+from flask import Blueprint, Response, request, jsonify
+from src.models.user import db, User, Jogo, Raspadinha, Saque, Configuracao, PartnerCoupon, PartnerCouponUsageShard, TicketBook # Import PartnerCoupon
+from src.routes.auth import token_required, token_snapshot_required
+from src.services.sorteio import montar_tabela, carregar_tabela_premios
+from src.services.ticket_book import criar_livro, MAX_BILHETES_POR_REQUISICAO
+from src.services.paginacao import pagina_keyset, estimar_total
+from src.services.replica import leitura_replica, usar_primario
+from src.services import estatisticas, resumo_diario, exportacao, saques, configuracoes, cupons, metricas, serializacao
 from datetime import datetime, timedelta
+from decimal import Decimal
 from functools import wraps
-from sqlalchemy import func, and_, exc # Import exc for exception handling
+from sqlalchemy import func, exc, select # Import exc for exception handling
+import json
 import os
 
 admin_bp = Blueprint("admin", __name__)
 
 ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL", "admin@raspadinha.com")
+MAX_SAQUES_POR_LOTE = 10_000
 
 def admin_required(f):
     @wraps(f)
@@ -23,103 +31,226 @@ def admin_required(f):
 # ... (código anterior das rotas /dashboard, /usuarios, /jogos, /saques, /configuracoes permanece aqui) ...
 
 @admin_bp.route("/dashboard", methods=["GET"])
-@token_required
+@token_snapshot_required
 @admin_required
+@leitura_replica
 def get_dashboard(current_user):
     """Retorna dados para o dashboard administrativo"""
-    total_usuarios = User.query.count()
-    total_jogos = Jogo.query.count()
-    total_arrecadado = db.session.query(func.sum(Jogo.valor_total)).scalar() or 0
-    total_premios = db.session.query(func.sum(Jogo.premio_total)).scalar() or 0
-    saques_pendentes = Saque.query.filter_by(status="pendente").count()
-    valor_saques_pendentes = db.session.query(func.sum(Saque.valor)).filter_by(status="pendente").scalar() or 0
-    data_limite = datetime.utcnow() - timedelta(days=7)
-    novos_usuarios = User.query.filter(User.data_cadastro >= data_limite).count()
-    jogos_recentes = Jogo.query.filter(Jogo.data_jogo >= data_limite).count()
-    total_cupons_ativos = PartnerCoupon.query.filter_by(is_active=True).count()
-    total_cadastros_cupom = db.session.query(func.sum(PartnerCoupon.usage_count)).scalar() or 0
+    totais = estatisticas.ler()
+    total_arrecadado = totais["total_arrecadado"]
+    total_premios = totais["total_premios"]
+    if not resumo_diario.calculado():
+        usar_primario()
+        resumo_diario.recalcular()
+        db.session.commit()
+    ultimos_7d = resumo_diario.ultimos_dias(7)
+    novos_usuarios = ultimos_7d["novos_usuarios"]
+    jogos_recentes = ultimos_7d["quantidade_jogos"]
 
     return jsonify({
-        "total_usuarios": total_usuarios,
-        "total_jogos": total_jogos,
+        "total_usuarios": totais["total_usuarios"],
+        "total_jogos": totais["total_jogos"],
         "total_arrecadado": float(total_arrecadado),
         "total_premios": float(total_premios),
         "lucro": float(total_arrecadado - total_premios),
         "margem_lucro": float(((total_arrecadado - total_premios) / total_arrecadado) * 100) if total_arrecadado > 0 else 0,
-        "saques_pendentes": saques_pendentes,
-        "valor_saques_pendentes": float(valor_saques_pendentes),
+        "saques_pendentes": totais["saques_pendentes"],
+        "valor_saques_pendentes": float(totais["valor_saques_pendentes"]),
         "novos_usuarios_7d": novos_usuarios,
         "jogos_7d": jogos_recentes,
-        "total_cupons_ativos": total_cupons_ativos,
-        "total_cadastros_cupom": total_cadastros_cupom
+        "total_cupons_ativos": totais["total_cupons_ativos"],
+        "total_cadastros_cupom": totais["total_cadastros_cupom"]
     }), 200
 
-@admin_bp.route("/usuarios", methods=["GET"])
+@admin_bp.route("/dashboard/recalcular", methods=["POST"])
 @token_required
 @admin_required
+def recalcular_dashboard(current_user):
+    """Recalcula os totais do dashboard a partir das tabelas de origem"""
+    estatisticas.recalcular()
+    db.session.commit()
+    return jsonify({"message": "Totais do dashboard recalculados com sucesso!"}), 200
+
+@admin_bp.route("/usuarios", methods=["GET"])
+@token_snapshot_required
+@admin_required
+@leitura_replica
 def get_usuarios(current_user):
     """Retorna lista de usuários para o painel administrativo"""
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 20, type=int)
-    usuarios_paginados = User.query.order_by(User.data_cadastro.desc()).paginate(page=page, per_page=per_page)
+    plano = serializacao.PLANO_USUARIO
+    return _listar(User.query.with_entities(*plano.colunas), User.data_cadastro, User.id, "usuarios", plano.linhas)
+
+def _listar(query, coluna_data, coluna_id, chave, serializar):
+    """Lista paginada por página/offset (padrão) ou por cursor.
+
+    `query` seleciona só as colunas usadas por `serializar`, que converte as
+    linhas da página em dicts (ver src/services/serializacao.py).
+    Parâmetros: `cursor` (ou modo=cursor) ativa a paginação por cursor;
+    `total` = exato | estimado | nenhum define como o total é calculado
+    (padrão: exato no modo página, nenhum no modo cursor).
+    """
+    per_page = min(max(request.args.get("per_page", 20, type=int), 1), 100)
+    modo_cursor = "cursor" in request.args or request.args.get("modo") == "cursor"
+    modo_total = request.args.get("total", "nenhum" if modo_cursor else "exato")
+    if modo_total not in ("exato", "estimado", "nenhum"):
+        return jsonify({"message": "Parâmetro total inválido! Use exato, estimado ou nenhum"}), 400
+    
+    if modo_total == "exato":
+        total = query.order_by(None).count()
+    elif modo_total == "estimado":
+        total = estimar_total(query)
+    else:
+        total = None
+    
+    if modo_cursor:
+        try:
+            itens, proximo_cursor = pagina_keyset(query, coluna_data, coluna_id, request.args.get("cursor"), per_page)
+        except ValueError:
+            return jsonify({"message": "Cursor inválido!"}), 400
+        return jsonify({
+            chave: serializar(itens),
+            "total": total,
+            "proximo_cursor": proximo_cursor
+        }), 200
+    
+    page = max(request.args.get("page", 1, type=int), 1)
+    paginado = query.order_by(coluna_data.desc(), coluna_id.desc()).paginate(page=page, per_page=per_page, count=False)
     return jsonify({
-        "usuarios": [user.to_dict() for user in usuarios_paginados.items],
-        "total": usuarios_paginados.total,
-        "pages": usuarios_paginados.pages,
+        chave: serializar(paginado.items),
+        "total": total,
+        "pages": -(-total // per_page) if total is not None else None,
         "current_page": page
     }), 200
 
-@admin_bp.route("/jogos", methods=["GET"])
-@token_required
-@admin_required
-def get_jogos(current_user):
-    """Retorna lista de jogos para o painel administrativo"""
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 20, type=int)
-    user_id = request.args.get("user_id", type=int)
+def _periodo(coluna):
+    """Filtros de data_inicio/data_fim (YYYY-MM-DD, inclusivos) sobre `coluna`"""
+    filtros = []
     data_inicio = request.args.get("data_inicio")
     data_fim = request.args.get("data_fim")
-    query = Jogo.query
-    if user_id:
-        query = query.filter_by(user_id=user_id)
     if data_inicio:
         try:
-            data_inicio_dt = datetime.strptime(data_inicio, "%Y-%m-%d")
-            query = query.filter(Jogo.data_jogo >= data_inicio_dt)
+            filtros.append(coluna >= datetime.strptime(data_inicio, "%Y-%m-%d"))
         except ValueError:
             pass
     if data_fim:
         try:
-            data_fim_dt = datetime.strptime(data_fim, "%Y-%m-%d") + timedelta(days=1)
-            query = query.filter(Jogo.data_jogo < data_fim_dt)
+            filtros.append(coluna < datetime.strptime(data_fim, "%Y-%m-%d") + timedelta(days=1))
         except ValueError:
             pass
-    jogos_paginados = query.order_by(Jogo.data_jogo.desc()).paginate(page=page, per_page=per_page)
-    return jsonify({
-        "jogos": [jogo.to_dict() for jogo in jogos_paginados.items],
-        "total": jogos_paginados.total,
-        "pages": jogos_paginados.pages,
-        "current_page": page
-    }), 200
+    return filtros
+
+def _filtros_jogos():
+    filtros = _periodo(Jogo.data_jogo)
+    user_id = request.args.get("user_id", type=int)
+    if user_id:
+        filtros.append(Jogo.user_id == user_id)
+    return filtros
+
+def _filtros_saques():
+    filtros = _periodo(Saque.data_solicitacao)
+    user_id = request.args.get("user_id", type=int)
+    status = request.args.get("status")
+    if user_id:
+        filtros.append(Saque.user_id == user_id)
+    if status:
+        filtros.append(Saque.status == status)
+    return filtros
+
+@admin_bp.route("/jogos", methods=["GET"])
+@token_snapshot_required
+@admin_required
+@leitura_replica
+def get_jogos(current_user):
+    """Retorna lista de jogos para o painel administrativo"""
+    query = Jogo.query.with_entities(*serializacao.COLUNAS_JOGO_DETALHES).filter(*_filtros_jogos())
+    return _listar(query, Jogo.data_jogo, Jogo.id, "jogos", serializacao.jogos)
+
+@admin_bp.route("/jogos/exportar", methods=["GET"])
+@token_snapshot_required
+@admin_required
+@leitura_replica
+def exportar_jogos(current_user):
+    """Exporta os jogos filtrados em CSV ou NDJSON (streaming)"""
+    formato = request.args.get("formato", "csv")
+    if formato not in exportacao.FORMATOS:
+        return jsonify({"message": "Formato inválido! Use csv ou ndjson"}), 400
+    stmt = (
+        select(Jogo.id, Jogo.user_id, Jogo.quantidade_raspadinhas, Jogo.valor_total, Jogo.premio_total,
+               Jogo.data_jogo, Jogo.origem_saldo, Jogo.usou_bonus)
+        .where(*_filtros_jogos())
+        .order_by(Jogo.data_jogo, Jogo.id)
+    )
+    return exportacao.exportar(stmt, formato, "jogos")
 
 @admin_bp.route("/saques", methods=["GET"])
-@token_required
+@token_snapshot_required
 @admin_required
+@leitura_replica
 def get_saques(current_user):
     """Retorna lista de saques para o painel administrativo"""
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 20, type=int)
-    status = request.args.get("status")
-    query = Saque.query
-    if status:
-        query = query.filter_by(status=status)
-    saques_paginados = query.order_by(Saque.data_solicitacao.desc()).paginate(page=page, per_page=per_page)
-    return jsonify({
-        "saques": [saque.to_dict() for saque in saques_paginados.items],
-        "total": saques_paginados.total,
-        "pages": saques_paginados.pages,
-        "current_page": page
-    }), 200
+    plano = serializacao.PLANO_SAQUE
+    query = Saque.query.with_entities(*plano.colunas).filter(*_filtros_saques())
+    return _listar(query, Saque.data_solicitacao, Saque.id, "saques", plano.linhas)
+
+@admin_bp.route("/saques/exportar", methods=["GET"])
+@token_snapshot_required
+@admin_required
+@leitura_replica
+def exportar_saques(current_user):
+    """Exporta os saques filtrados em CSV ou NDJSON (streaming)"""
+    formato = request.args.get("formato", "csv")
+    if formato not in exportacao.FORMATOS:
+        return jsonify({"message": "Formato inválido! Use csv ou ndjson"}), 400
+    stmt = (
+        select(Saque.id, Saque.user_id, Saque.valor, Saque.chave_pix, Saque.status,
+               Saque.data_solicitacao, Saque.data_processamento)
+        .where(*_filtros_saques())
+        .order_by(Saque.data_solicitacao, Saque.id)
+    )
+    return exportacao.exportar(stmt, formato, "saques")
+
+@admin_bp.route("/saques/status", methods=["PUT"])
+@token_required
+@admin_required
+def atualizar_status_saques_em_lote(current_user):
+    """Atualiza o status de vários saques (lista de ids ou filtro) em uma transação"""
+    data = request.get_json() or {}
+    if data.get("status") not in saques.STATUS_VALIDOS:
+        return jsonify({"message": f"Status inválido! Valores permitidos: {', '.join(saques.STATUS_VALIDOS)}"}), 400
+    ids = data.get("ids")
+    filtro = data.get("filtro")
+    if ids:
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return jsonify({"message": "ids deve ser uma lista de inteiros!"}), 400
+        if len(ids) > MAX_SAQUES_POR_LOTE:
+            return jsonify({"message": f"Máximo de {MAX_SAQUES_POR_LOTE} ids por requisição!"}), 400
+        condicoes = [Saque.id.in_(ids)]
+    elif isinstance(filtro, dict) and filtro:
+        condicoes = []
+        try:
+            if filtro.get("status"):
+                condicoes.append(Saque.status == filtro["status"])
+            if filtro.get("user_id"):
+                condicoes.append(Saque.user_id == int(filtro["user_id"]))
+            if filtro.get("data_inicio"):
+                condicoes.append(Saque.data_solicitacao >= datetime.strptime(filtro["data_inicio"], "%Y-%m-%d"))
+            if filtro.get("data_fim"):
+                condicoes.append(Saque.data_solicitacao < datetime.strptime(filtro["data_fim"], "%Y-%m-%d") + timedelta(days=1))
+        except (TypeError, ValueError):
+            return jsonify({"message": "Filtro inválido! Use status, user_id, data_inicio e data_fim (YYYY-MM-DD)"}), 400
+        if not condicoes:
+            return jsonify({"message": "Filtro vazio! Informe ao menos um critério."}), 400
+    else:
+        return jsonify({"message": "Informe ids ou filtro!"}), 400
+    
+    try:
+        alterados = saques.transicionar_em_lote(condicoes, data["status"])
+        db.session.commit()
+    except exc.SQLAlchemyError as e:
+        db.session.rollback()
+        print(f"Erro ao atualizar saques em lote: {e}")
+        return jsonify({"message": "Erro interno ao atualizar saques."}), 500
+    return jsonify({"message": f"{alterados} saque(s) atualizado(s) com sucesso!", "alterados": alterados}), 200
 
 @admin_bp.route("/saques/<int:saque_id>/status", methods=["PUT"])
 @token_required
@@ -129,19 +260,17 @@ def atualizar_status_saque(current_user, saque_id):
     data = request.get_json()
     if not data or "status" not in data:
         return jsonify({"message": "Status é obrigatório!"}), 400
-    status_validos = ["pendente", "processando", "concluido", "cancelado"]
-    if data["status"] not in status_validos:
-        return jsonify({"message": f"Status inválido! Valores permitidos: {', '.join(status_validos)}"}), 400
-    saque = Saque.query.get(saque_id)
+    if data["status"] not in saques.STATUS_VALIDOS:
+        return jsonify({"message": f"Status inválido! Valores permitidos: {', '.join(saques.STATUS_VALIDOS)}"}), 400
+    # Bloqueia a linha para não cruzar com o worker de pagamentos
+    saque = Saque.query.with_for_update().filter_by(id=saque_id).first()
     if not saque:
         return jsonify({"message": "Saque não encontrado!"}), 404
-    if data["status"] == "cancelado" and saque.status != "cancelado":
-        usuario = User.query.get(saque.user_id)
-        if usuario:
-            usuario.add_saldo(saque.valor)
-    saque.status = data["status"]
-    if data["status"] in ["concluido", "cancelado"]:
-        saque.data_processamento = datetime.utcnow()
+    try:
+        saques.transicionar(saque, data["status"])
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
     db.session.commit()
     return jsonify({
         "message": "Status do saque atualizado com sucesso!",
@@ -149,8 +278,9 @@ def atualizar_status_saque(current_user, saque_id):
     }), 200
 
 @admin_bp.route("/relatorios/financeiro", methods=["GET"])
-@token_required
+@token_snapshot_required
 @admin_required
+@leitura_replica
 def relatorio_financeiro(current_user):
     """Gera relatório financeiro com base em período"""
     data_inicio = request.args.get("data_inicio")
@@ -165,12 +295,17 @@ def relatorio_financeiro(current_user):
     except ValueError:
         return jsonify({"message": "Formato de data inválido! Use YYYY-MM-DD"}), 400
     
-    total_arrecadado = db.session.query(func.sum(Jogo.valor_total)).filter(and_(Jogo.data_jogo >= data_inicio_dt, Jogo.data_jogo < data_fim_dt)).scalar() or 0
-    total_premios = db.session.query(func.sum(Jogo.premio_total)).filter(and_(Jogo.data_jogo >= data_inicio_dt, Jogo.data_jogo < data_fim_dt)).scalar() or 0
-    total_saques = db.session.query(func.sum(Saque.valor)).filter(and_(Saque.data_solicitacao >= data_inicio_dt, Saque.data_solicitacao < data_fim_dt)).scalar() or 0
-    total_saques_concluidos = db.session.query(func.sum(Saque.valor)).filter(and_(Saque.data_processamento >= data_inicio_dt, Saque.data_processamento < data_fim_dt, Saque.status == "concluido")).scalar() or 0
-    qtd_jogos = Jogo.query.filter(and_(Jogo.data_jogo >= data_inicio_dt, Jogo.data_jogo < data_fim_dt)).count()
-    qtd_raspadinhas = db.session.query(func.sum(Jogo.quantidade_raspadinhas)).filter(and_(Jogo.data_jogo >= data_inicio_dt, Jogo.data_jogo < data_fim_dt)).scalar() or 0
+    if not resumo_diario.calculado():
+        usar_primario()
+        resumo_diario.recalcular()
+        db.session.commit()
+    resumo = resumo_diario.somar(data_inicio_dt.date(), data_fim_dt.date())
+    total_arrecadado = resumo["total_arrecadado"]
+    total_premios = resumo["total_premios"]
+    total_saques = resumo["saques_solicitados"]
+    total_saques_concluidos = resumo["saques_concluidos"]
+    qtd_jogos = resumo["quantidade_jogos"]
+    qtd_raspadinhas = resumo["quantidade_raspadinhas"]
     lucro = total_arrecadado - total_premios
     margem_lucro = (lucro / total_arrecadado * 100) if total_arrecadado > 0 else 0
     
@@ -193,7 +328,7 @@ def relatorio_financeiro(current_user):
     }), 200
 
 @admin_bp.route("/configuracoes", methods=["GET"])
-@token_required
+@token_snapshot_required
 @admin_required
 def get_configuracoes(current_user):
     """Retorna todas as configurações do sistema"""
@@ -208,21 +343,76 @@ def criar_configuracao(current_user):
     data = request.get_json()
     if not data or "chave" not in data or "valor" not in data:
         return jsonify({"message": "Chave e valor são obrigatórios!"}), 400
+    # Guardado como texto; números, booleanos e a tabela de prêmios podem vir como JSON
+    valor = data["valor"] if isinstance(data["valor"], str) else json.dumps(data["valor"])
+    try:
+        configuracoes.converter(data["chave"], valor)
+    except ValueError as e:
+        return jsonify({"message": f"Valor inválido para {data['chave']}: {e}"}), 400
     config = Configuracao.query.filter_by(chave=data["chave"]).first()
     if config:
-        config.valor = data["valor"]
+        config.valor = valor
         if "descricao" in data:
             config.descricao = data["descricao"]
     else:
-        config = Configuracao(chave=data["chave"], valor=data["valor"], descricao=data.get("descricao"))
+        config = Configuracao(chave=data["chave"], valor=valor, descricao=data.get("descricao"))
         db.session.add(config)
+    config.versao = configuracoes.proxima_versao()
     db.session.commit()
+    configuracoes.invalidar()
     return jsonify({"message": "Configuração salva com sucesso!", "configuracao": config.to_dict()}), 200
 
+# --- Livros de Bilhetes Pré-gerados ---
+
+@admin_bp.route("/ticket-books", methods=["GET"])
+@token_snapshot_required
+@admin_required
+def get_ticket_books(current_user):
+    """Lista os livros de bilhetes"""
+    livros = TicketBook.query.order_by(TicketBook.id.desc()).all()
+    return jsonify({"ticket_books": [livro.to_dict() for livro in livros]}), 200
+
+@admin_bp.route("/ticket-books", methods=["POST"])
+@token_required
+@admin_required
+def create_ticket_book(current_user):
+    """Gera um novo livro de bilhetes a partir da tabela de prêmios atual (ou da enviada)"""
+    data = request.get_json() or {}
+    total = data.get("total")
+    if not isinstance(total, int) or total <= 0 or total > MAX_BILHETES_POR_REQUISICAO:
+        return jsonify({"message": f"Total deve ser um inteiro entre 1 e {MAX_BILHETES_POR_REQUISICAO}! "
+                                   "Livros maiores são gerados com o script gerar_ticket_book.py."}), 400
+    try:
+        tabela = montar_tabela(data["tabela_premios"]) if data.get("tabela_premios") else carregar_tabela_premios()
+        livro = criar_livro(total, tabela)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"message": f"Tabela de prêmios inválida: {e}"}), 400
+    db.session.commit()
+    return jsonify({
+        "message": "Livro de bilhetes criado com sucesso!",
+        "ticket_book": livro.to_dict(),
+        "payout": float(livro.premio_total / (livro.total * _valor_raspadinha())) if livro.total else 0
+    }), 201
+
+@admin_bp.route("/ticket-books/<int:livro_id>/toggle", methods=["PUT"])
+@token_required
+@admin_required
+def toggle_ticket_book(current_user, livro_id):
+    """Ativa ou desativa a venda de um livro de bilhetes"""
+    livro = TicketBook.query.get(livro_id)
+    if not livro:
+        return jsonify({"message": "Livro de bilhetes não encontrado!"}), 404
+    livro.ativo = not livro.ativo
+    db.session.commit()
+    return jsonify({"message": "Livro atualizado com sucesso!", "ticket_book": livro.to_dict()}), 200
+
+def _valor_raspadinha():
+    return configuracoes.obter("valor_raspadinha", Decimal("5.00"))
+
 # --- Novas Rotas para Gerenciamento de Cupons de Parceiros --- 
 
 @admin_bp.route("/partner-coupons", methods=["GET"])
-@token_required
+@token_snapshot_required
 @admin_required
 def get_partner_coupons(current_user):
     """Lista todos os cupons de parceiros"""
@@ -252,7 +442,9 @@ def create_partner_coupon(current_user):
     
     try:
         db.session.add(new_coupon)
+        estatisticas.incrementar(total_cupons_ativos=1)
         db.session.commit()
+        cupons.invalidar()
         return jsonify({"message": "Cupom de parceiro criado com sucesso!", "coupon": new_coupon.to_dict()}), 201
     except exc.IntegrityError:
         db.session.rollback()
@@ -272,7 +464,9 @@ def toggle_partner_coupon(current_user, coupon_id):
         return jsonify({"message": "Cupom não encontrado!"}), 404
         
     coupon.is_active = not coupon.is_active
+    estatisticas.incrementar(total_cupons_ativos=1 if coupon.is_active else -1)
     db.session.commit()
+    cupons.invalidar()
     
     status = "ativado" if coupon.is_active else "desativado"
     return jsonify({"message": f"Cupom {status} com sucesso!", "coupon": coupon.to_dict()}), 200
@@ -291,8 +485,14 @@ def delete_partner_coupon(current_user, coupon_id):
     #     return jsonify({"message": "Não é possível excluir cupons que já foram utilizados. Desative-o."}), 400
         
     try:
+        estatisticas.incrementar(
+            total_cupons_ativos=-1 if coupon.is_active else 0,
+            total_cadastros_cupom=-coupon.total_usos
+        )
+        PartnerCouponUsageShard.query.filter_by(coupon_id=coupon.id).delete(synchronize_session=False)
         db.session.delete(coupon)
         db.session.commit()
+        cupons.invalidar()
         return jsonify({"message": "Cupom excluído com sucesso!"}), 200
     except Exception as e:
         db.session.rollback()
@@ -303,14 +503,35 @@ def delete_partner_coupon(current_user, coupon_id):
         return jsonify({"message": "Erro interno ao excluir cupom."}), 500
 
 @admin_bp.route("/reports/partner-usage", methods=["GET"])
-@token_required
+@token_snapshot_required
 @admin_required
+@leitura_replica
 def report_partner_usage(current_user):
     """Retorna dados agregados sobre o uso de cupons de parceiros"""
     # Retorna todos os cupons com suas contagens de uso
-    coupons_usage = PartnerCoupon.query.order_by(PartnerCoupon.usage_count.desc()).all()
+    coupons_usage = PartnerCoupon.query.order_by(
+        (func.coalesce(PartnerCoupon.usage_count, 0) + PartnerCoupon.usos_shards).desc()
+    ).all()
     
     # Poderia adicionar filtros por data de cadastro do usuário, etc. se necessário
     
     return jsonify({"report": [coupon.to_dict() for coupon in coupons_usage]}), 200
 
+
+@admin_bp.route("/metricas", methods=["GET"])
+def get_metricas():
+    """Métricas por endpoint deste processo, no formato texto do Prometheus.
+
+    Aceita o token do coletor (METRICAS_TOKEN) ou o JWT de um admin.
+    """
+    if metricas.token_valido(request.headers.get("Authorization")):
+        return _resposta_metricas()
+    return _metricas_admin()
+
+@token_snapshot_required
+@admin_required
+def _metricas_admin(current_user):
+    return _resposta_metricas()
+
+def _resposta_metricas():
+    return Response(metricas.exportar_prometheus(), content_type=metricas.CONTENT_TYPE), 200
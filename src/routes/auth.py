@@ -1,40 +1,78 @@
 # -*- coding: utf-8 -*-
 from flask import Blueprint, request, jsonify
-from src.models.user import db, User, PartnerCoupon # Import PartnerCoupon
+from src.models.user import db, User
+from sqlalchemy import exc, or_
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime
 import jwt
 import os
 from functools import wraps
+from src.services import estatisticas, resumo_diario, cupons, ultimo_login
+from src.services.autenticacao import tokens_cache, usuarios_cache, criar_snapshot, invalidar_usuario
+from src.services.etag import com_etag, carimbo_perfil
 
 auth_bp = Blueprint("auth", __name__)
 
 # Chave secreta para JWT
 SECRET_KEY = os.environ.get("SECRET_KEY", "raspadinha-premiada-secret-key")
 ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL", "admin@raspadinha.com") # Mantém a verificação de admin por email
+# Tentativas de cadastro quando o cupom em cache foi excluído por outro worker
+TENTATIVAS_CADASTRO = 2
+
+def _decodificar_token():
+    """Retorna (payload, None) ou (None, resposta de erro)"""
+    token = None
+    if "Authorization" in request.headers:
+        auth_header = request.headers["Authorization"]
+        if auth_header.startswith("Bearer "):
+            token = auth_header.split(" ")[1]
+    
+    if not token:
+        return None, (jsonify({"message": "Token de autenticação ausente!"}), 401)
+    
+    data = tokens_cache.get(token)
+    try:
+        if data is None:
+            data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            tokens_cache.set(token, data)
+        elif data.get("exp") is not None and data["exp"] < datetime.utcnow().timestamp():
+            tokens_cache.invalidar(token)
+            raise jwt.ExpiredSignatureError()
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({"message": "Token expirado. Por favor, faça login novamente!"}), 401)
+    except jwt.InvalidTokenError:
+        return None, (jsonify({"message": "Token inválido. Por favor, faça login novamente!"}), 401)
+    return data, None
 
 # Decorator para verificar token JWT
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if "Authorization" in request.headers:
-            auth_header = request.headers["Authorization"]
-            if auth_header.startswith("Bearer "):
-                token = auth_header.split(" ")[1]
-        
-        if not token:
-            return jsonify({"message": "Token de autenticação ausente!"}), 401
-        
-        try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            current_user = User.query.filter_by(id=data["user_id"]).first()
-            if not current_user:
+        data, erro = _decodificar_token()
+        if erro:
+            return erro
+        current_user = User.query.filter_by(id=data["user_id"]).first()
+        if not current_user:
+            return jsonify({"message": "Usuário não encontrado!"}), 401
+        criar_snapshot(current_user, current_user.email == ADMIN_EMAIL)
+        return f(current_user, *args, **kwargs)
+    return decorated
+
+# Decorator para rotas somente de leitura: entrega um UsuarioSnapshot (id,
+# email, nome, is_admin) em vez do objeto User, consultando o banco apenas
+# quando o resumo não está em cache
+def token_snapshot_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        data, erro = _decodificar_token()
+        if erro:
+            return erro
+        current_user = usuarios_cache.get(data["user_id"])
+        if current_user is None:
+            user = User.query.filter_by(id=data["user_id"]).first()
+            if not user:
                 return jsonify({"message": "Usuário não encontrado!"}), 401
-        except jwt.ExpiredSignatureError:
-            return jsonify({"message": "Token expirado. Por favor, faça login novamente!"}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({"message": "Token inválido. Por favor, faça login novamente!"}), 401
-            
+            current_user = criar_snapshot(user, user.email == ADMIN_EMAIL)
         return f(current_user, *args, **kwargs)
     return decorated
 
@@ -48,67 +86,86 @@ def register():
         if field not in data or not data[field]: 
             return jsonify({"message": f"Campo {field} é obrigatório!"}), 400
     
-    if User.query.filter_by(email=data["email"]).first():
-        return jsonify({"message": "Este email já está cadastrado!"}), 400
-    
     # --- Processamento de Código de Indicação/Cupom ---
     referral_code_input = data.get("referral_code_input")
-    referring_user = None
-    partner_coupon = None
     
-    if referral_code_input:
-        # 1. Tentar encontrar como Cupom de Parceiro
-        partner_coupon = PartnerCoupon.query.filter_by(code=referral_code_input, is_active=True).first()
+    for _ in range(TENTATIVAS_CADASTRO):
+        # 1. Tentar encontrar como Cupom de Parceiro (índice em memória)
+        partner_coupon_id = cupons.buscar_cupom_ativo(referral_code_input) if referral_code_input else None
         
-        if not partner_coupon:
-            # 2. Se não for cupom, tentar encontrar como Código de Indicação de Usuário
-            referring_user = User.query.filter_by(referral_code=referral_code_input).first()
+        # 2. Uma única consulta verifica o email e, se não for cupom, busca o
+        #    usuário dono do Código de Indicação
+        filtros = [User.email == data["email"]]
+        if referral_code_input and not partner_coupon_id:
+            filtros.append(User.referral_code == referral_code_input)
+        encontrados = User.query.filter(or_(*filtros)).all()
+        
+        if any(u.email == data["email"] for u in encontrados):
+            return jsonify({"message": "Este email já está cadastrado!"}), 400
+        
+        referring_user = None
+        if referral_code_input and not partner_coupon_id:
+            referring_user = next((u for u in encontrados if u.referral_code == referral_code_input), None)
 
-    # Criar novo usuário
-    new_user = User(
-        nome=data["nome"],
-        email=data["email"],
-        telefone=data["telefone"],
-        # Associa ao cupom ou usuário que indicou, se houver
-        partner_coupon_id=partner_coupon.id if partner_coupon else None,
-        referred_by_user_id=referring_user.id if referring_user else None
-    )
-    new_user.set_password(data["password"])
-    
-    # Salvar novo usuário primeiro para obter o ID (se necessário)
-    db.session.add(new_user)
-    # Não comitar ainda, precisamos atualizar o indicador/cupom
+        # Criar novo usuário
+        new_user = User(
+            nome=data["nome"],
+            email=data["email"],
+            telefone=data["telefone"],
+            # Associa ao cupom ou usuário que indicou, se houver
+            partner_coupon_id=partner_coupon_id,
+            referred_by_user_id=referring_user.id if referring_user else None
+        )
+        new_user.set_password(data["password"])
+        
+        # Salvar novo usuário primeiro para obter o ID (se necessário)
+        db.session.add(new_user)
+        # Não comitar ainda, precisamos atualizar o indicador/cupom
 
-    # --- Atualizar Contador e Conceder Bônus (se aplicável) ---
-    try:
-        if partner_coupon:
-            partner_coupon.usage_count = (partner_coupon.usage_count or 0) + 1
-            db.session.add(partner_coupon) # Adiciona a atualização do cupom à sessão
+        # --- Atualizar Contador e Conceder Bônus (se aplicável) ---
+        try:
+            estatisticas.incrementar(total_usuarios=1, total_cadastros_cupom=1 if partner_coupon_id else 0)
+            resumo_diario.registrar(None, novos_usuarios=1)
+        
+            if partner_coupon_id:
+                cupons.registrar_uso(partner_coupon_id)
             
-        elif referring_user:
-            referring_user.referral_count = (referring_user.referral_count or 0) + 1
+            elif referring_user:
+                referring_user.referral_count = (referring_user.referral_count or 0) + 1
             
-            # Verificar se atingiu múltiplo de 3 e se o bônus para *este* limiar ainda não foi dado
-            # Ex: Se count é 3, bonus_count deve ser 0. Se count é 6, bonus_count deve ser 1.
-            required_bonus_count = referring_user.referral_count // 3
-            if required_bonus_count > (referring_user.referral_bonus_awarded_count or 0):
-                referring_user.add_bonus_raspadinha(1)
-                referring_user.referral_bonus_awarded_count = required_bonus_count # Atualiza para o novo limiar atingido
+                # Verificar se atingiu múltiplo de 3 e se o bônus para *este* limiar ainda não foi dado
+                # Ex: Se count é 3, bonus_count deve ser 0. Se count é 6, bonus_count deve ser 1.
+                required_bonus_count = referring_user.referral_count // 3
+                if required_bonus_count > (referring_user.referral_bonus_awarded_count or 0):
+                    referring_user.add_bonus_raspadinha(1)
+                    referring_user.referral_bonus_awarded_count = required_bonus_count # Atualiza para o novo limiar atingido
                 
-            db.session.add(referring_user) # Adiciona a atualização do usuário indicador à sessão
+                db.session.add(referring_user) # Adiciona a atualização do usuário indicador à sessão
 
-        # Agora comitar todas as alterações juntas (novo usuário, cupom/indicador)
-        db.session.commit()
+            # Agora comitar todas as alterações juntas (novo usuário, cupom/indicador)
+            db.session.commit()
         
-    except Exception as e:
-        db.session.rollback() # Desfaz tudo se houver erro ao atualizar contadores/bônus
-        print(f"Erro ao processar indicação/cupom: {e}") # Log do erro
-        return jsonify({"message": "Erro interno ao processar código de indicação/cupom."}), 500
+        except exc.IntegrityError as e:
+            db.session.rollback()
+            if partner_coupon_id:
+                # O índice em cache pode apontar para um cupom excluído em outro
+                # worker: recarrega do banco e refaz o cadastro se o cupom mudou
+                cupons.invalidar()
+                if cupons.buscar_cupom_ativo(referral_code_input) != partner_coupon_id:
+                    continue
+            print(f"Erro de integridade no cadastro: {e}")
+            return jsonify({"message": "Não foi possível concluir o cadastro. Tente novamente."}), 400
+        except Exception as e:
+            db.session.rollback() # Desfaz tudo se houver erro ao atualizar contadores/bônus
+            print(f"Erro ao processar indicação/cupom: {e}") # Log do erro
+            return jsonify({"message": "Erro interno ao processar código de indicação/cupom."}), 500
 
-    return jsonify({
-        "message": "Usuário cadastrado com sucesso!",
-        "user": new_user.to_dict() # Retorna dados básicos, sem info de indicação
-    }), 201
+        return jsonify({
+            "message": "Usuário cadastrado com sucesso!",
+            "user": new_user.to_dict() # Retorna dados básicos, sem info de indicação
+        }), 201
+    
+    return jsonify({"message": "Não foi possível concluir o cadastro. Tente novamente."}), 400
 
 @auth_bp.route("/login", methods=["POST"])
 def login():
@@ -120,8 +177,15 @@ def login():
     if not user or not user.check_password(data["password"]):
         return jsonify({"message": "Email ou senha incorretos!"}), 401
     
-    user.ultimo_login = datetime.utcnow()
-    db.session.commit()
+    # Migra hashes antigos para a política atual de hash
+    if user.password_needs_rehash():
+        user.set_password(data["password"])
+        db.session.commit()
+    
+    # Último login gravado em lote (ver src/services/ultimo_login.py)
+    agora = datetime.utcnow()
+    if ultimo_login.registrar(user, agora):
+        set_committed_value(user, "ultimo_login", agora)
     
     token = jwt.encode(
         {
@@ -135,14 +199,18 @@ def login():
         algorithm="HS256"
     )
     
+    user_dict = user.to_dict() # Retorna dados do usuário logado
+    ultimo_login.flush_se_necessario()
+    
     return jsonify({
         "message": "Login realizado com sucesso!",
         "token": token,
-        "user": user.to_dict() # Retorna dados do usuário logado
+        "user": user_dict
     }), 200
 
 @auth_bp.route("/profile", methods=["GET"])
 @token_required
+@com_etag(carimbo_perfil)
 def get_profile(current_user):
     # Retorna dados do perfil, incluindo informações de indicação
     profile_data = current_user.to_dict()
@@ -169,6 +237,7 @@ def update_profile(current_user):
         current_user.set_password(data["password"])
     
     db.session.commit()
+    invalidar_usuario(current_user.id)
     
     # Retorna o perfil atualizado, incluindo dados de indicação
     profile_data = current_user.to_dict()
@@ -1,83 +1,177 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db, User, Jogo, Raspadinha, Saque
-from src.routes.auth import token_required
+from src.routes.auth import token_required, token_snapshot_required
+from src.services.sorteio import sortear_raspadinhas, carregar_tabela_premios
+from src.services.ticket_book import reservar_bilhetes
+from src.services import resultado_compacto
+from src.services.paginacao import pagina_keyset
+from src.services.saldo import debitar, creditar
+from src.services.idempotencia import idempotente
+from src.services.replica import leitura_replica
+from src.services.etag import com_etag, carimbo_historico, carimbo_saques
+from src.services import estatisticas, resumo_diario, configuracoes, serializacao
+from sqlalchemy import insert, select
 from datetime import datetime
+from decimal import Decimal
+import os
 
 jogos_bp = Blueprint('jogos', __name__)
 
+VALOR_RASPADINHA_PADRAO = Decimal('5.00')
+MAX_RASPADINHAS_POR_JOGO = 100
+HISTORICO_LIMITE_PADRAO = 20
+HISTORICO_LIMITE_MAXIMO = 100
+# Grava os resultados das cartelas empacotados em Jogo.resultado_compacto
+ARMAZENAMENTO_COMPACTO = os.getenv('ARMAZENAMENTO_COMPACTO', 'false').lower() == 'true'
+
 @jogos_bp.route('/historico', methods=['GET'])
-@token_required
+@token_snapshot_required
+@leitura_replica
+@com_etag(carimbo_historico)
 def get_historico(current_user):
-    """Retorna o histórico de jogos do usuário"""
-    jogos = Jogo.query.filter_by(user_id=current_user.id).order_by(Jogo.data_jogo.desc()).all()
+    """Retorna o histórico de jogos do usuário, paginado por cursor"""
+    limite = min(max(request.args.get('limite', HISTORICO_LIMITE_PADRAO, type=int), 1), HISTORICO_LIMITE_MAXIMO)
+    cursor = request.args.get('cursor')
+    detalhes = request.args.get('detalhes', 'true').lower() != 'false'
+    
+    colunas = serializacao.COLUNAS_JOGO_DETALHES if detalhes else serializacao.PLANO_JOGO.colunas
+    query = Jogo.query.with_entities(*colunas).filter(Jogo.user_id == current_user.id)
+    try:
+        jogos, proximo_cursor = pagina_keyset(query, Jogo.data_jogo, Jogo.id, cursor, limite)
+    except ValueError:
+        return jsonify({'message': 'Cursor inválido!'}), 400
     
     return jsonify({
-        'jogos': [jogo.to_dict() for jogo in jogos]
+        'jogos': serializacao.jogos(jogos, incluir_raspadinhas=detalhes),
+        'proximo_cursor': proximo_cursor
     }), 200
 
+def _inserir_raspadinhas(jogo_id, sorteio):
+    """Insere todas as raspadinhas do jogo em lote e devolve os dicts com os ids"""
+    linhas = [
+        {'jogo_id': jogo_id, 'premio': premio, 'extra': extra}
+        for premio, extra in zip(sorteio.premios, sorteio.extras)
+    ]
+    stmt = insert(Raspadinha)
+    if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+        ids = db.session.scalars(stmt.returning(Raspadinha.id, sort_by_parameter_order=True), linhas).all()
+    else:
+        # Sem RETURNING ordenado em lote: o jogo acabou de ser criado, então
+        # as raspadinhas dele são exatamente as inseridas, na ordem dos ids
+        db.session.execute(stmt, linhas)
+        ids = db.session.scalars(
+            select(Raspadinha.id).where(Raspadinha.jogo_id == jogo_id).order_by(Raspadinha.id)
+        ).all()
+    return [
+        {'id': id_, 'jogo_id': jogo_id, 'premio': float(linha['premio']), 'extra': linha['extra']}
+        for id_, linha in zip(ids, linhas)
+    ]
+
 @jogos_bp.route('/novo', methods=['POST'])
 @token_required
+@idempotente('jogos.novo')
 def novo_jogo(current_user):
-    """Registra um novo jogo para o usuário"""
-    data = request.get_json()
+    """Compra e sorteia um novo jogo para o usuário"""
+    data = request.get_json() or {}
     
     # Verificar se todos os campos necessários estão presentes
-    required_fields = ['quantidade_raspadinhas', 'valor_total', 'premio_total', 'raspadinhas', 'origem_saldo']
+    required_fields = ['quantidade_raspadinhas', 'origem_saldo']
     for field in required_fields:
         if field not in data:
             return jsonify({'message': f'Campo {field} é obrigatório!'}), 400
     
+    try:
+        quantidade = int(data['quantidade_raspadinhas'])
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Quantidade de raspadinhas inválida!'}), 400
+    if quantidade <= 0 or quantidade > MAX_RASPADINHAS_POR_JOGO:
+        return jsonify({'message': f'A quantidade deve estar entre 1 e {MAX_RASPADINHAS_POR_JOGO}!'}), 400
+    
+    # O valor e os prêmios são sempre calculados no servidor
+    valor_unitario = configuracoes.obter('valor_raspadinha', VALOR_RASPADINHA_PADRAO)
+    valor_total = valor_unitario * quantidade
+    
     # Verificar se o usuário tem saldo suficiente (se estiver usando saldo interno)
-    if data['origem_saldo'] and current_user.saldo < data['valor_total']:
+    if data['origem_saldo'] and (current_user.saldo or 0) < valor_total:
         return jsonify({'message': 'Saldo insuficiente!'}), 400
     
+    # Usa o livro de bilhetes ativo, se houver; senão sorteia com semente própria
+    reserva = reservar_bilhetes(quantidade)
+    if reserva:
+        ticket_book_id, ticket_inicio, sorteio = reserva
+    else:
+        ticket_book_id, ticket_inicio = None, None
+        sorteio = sortear_raspadinhas(quantidade, carregar_tabela_premios())
+    
     # Criar novo jogo
     novo_jogo = Jogo(
         user_id=current_user.id,
-        quantidade_raspadinhas=data['quantidade_raspadinhas'],
-        valor_total=data['valor_total'],
-        premio_total=data['premio_total'],
-        origem_saldo=data['origem_saldo']
+        quantidade_raspadinhas=quantidade,
+        valor_total=valor_total,
+        premio_total=sorteio.premio_total,
+        origem_saldo=bool(data['origem_saldo']),
+        semente=sorteio.semente,
+        ticket_book_id=ticket_book_id,
+        ticket_inicio=ticket_inicio
     )
     
-    # Adicionar raspadinhas
-    for r in data['raspadinhas']:
-        raspadinha = Raspadinha(
-            premio=r['premio'],
-            extra=r.get('extra', False)
-        )
-        novo_jogo.raspadinhas.append(raspadinha)
+    # Gravar o jogo para obter o id e inserir as raspadinhas em lote
+    # (ou empacotadas no próprio jogo, no modo compacto)
+    if ARMAZENAMENTO_COMPACTO:
+        novo_jogo.resultado_compacto = resultado_compacto.codificar(sorteio.premios, sorteio.extras)
+    db.session.add(novo_jogo)
+    db.session.flush()
     
-    # Se estiver usando saldo interno, debitar do saldo
-    if data['origem_saldo']:
-        current_user.remove_saldo(data['valor_total'])
+    # Se estiver usando saldo interno, debitar do saldo (atômico no banco)
+    referencia = f'jogo:{novo_jogo.id}'
+    if novo_jogo.origem_saldo and debitar(current_user.id, valor_total, 'compra', referencia) is None:
+        db.session.rollback()
+        return jsonify({'message': 'Saldo insuficiente!'}), 400
     
     # Adicionar prêmio ao saldo do usuário
-    if data['premio_total'] > 0:
-        current_user.add_saldo(data['premio_total'])
+    if sorteio.premio_total > 0:
+        creditar(current_user.id, sorteio.premio_total, 'premio', referencia)
+    
+    if ARMAZENAMENTO_COMPACTO:
+        raspadinhas = None
+    else:
+        raspadinhas = _inserir_raspadinhas(novo_jogo.id, sorteio)
+    
+    estatisticas.incrementar(total_jogos=1, total_arrecadado=valor_total, total_premios=sorteio.premio_total)
+    resumo_diario.registrar(
+        novo_jogo.data_jogo, total_arrecadado=valor_total, total_premios=sorteio.premio_total,
+        quantidade_jogos=1, quantidade_raspadinhas=quantidade
+    )
     
-    # Salvar no banco de dados
-    db.session.add(novo_jogo)
+    # Resposta montada antes do commit para não recarregar jogo e usuário
+    jogo_dict = novo_jogo.to_dict(raspadinhas=raspadinhas)
+    saldo_atual = float(current_user.saldo or 0)
     db.session.commit()
     
     return jsonify({
         'message': 'Jogo registrado com sucesso!',
-        'jogo': novo_jogo.to_dict(),
-        'saldo_atual': current_user.saldo
+        'jogo': jogo_dict,
+        'saldo_atual': saldo_atual
     }), 201
 
 @jogos_bp.route('/saques', methods=['GET'])
-@token_required
+@token_snapshot_required
+@leitura_replica
+@com_etag(carimbo_saques)
 def get_saques(current_user):
     """Retorna o histórico de saques do usuário"""
-    saques = Saque.query.filter_by(user_id=current_user.id).order_by(Saque.data_solicitacao.desc()).all()
+    plano = serializacao.PLANO_SAQUE
+    saques = db.session.execute(
+        select(*plano.colunas).where(Saque.user_id == current_user.id).order_by(Saque.data_solicitacao.desc())
+    )
     
     return jsonify({
-        'saques': [saque.to_dict() for saque in saques]
+        'saques': plano.linhas(saques)
     }), 200
 
 @jogos_bp.route('/solicitar-saque', methods=['POST'])
 @token_required
+@idempotente('jogos.solicitar_saque')
 def solicitar_saque(current_user):
     """Solicita um saque do saldo do usuário"""
     data = request.get_json()
@@ -86,14 +180,25 @@ def solicitar_saque(current_user):
     if not data or not data.get('valor') or not data.get('chave_pix'):
         return jsonify({'message': 'Valor e chave Pix são obrigatórios!'}), 400
     
-    valor = float(data['valor'])
+    try:
+        valor = Decimal(str(data['valor'])).quantize(Decimal('0.01'))
+    except ArithmeticError:
+        return jsonify({'message': 'Valor inválido!'}), 400
+    
+    # NaN e Infinity passam pelo quantize, mas não podem ser comparados
+    if not valor.is_finite():
+        return jsonify({'message': 'Valor inválido!'}), 400
     
     # Verificar se o valor é válido
     if valor <= 0:
         return jsonify({'message': 'O valor deve ser maior que zero!'}), 400
     
+    min_saque = configuracoes.obter('min_saque')
+    if min_saque and valor < min_saque:
+        return jsonify({'message': f'O valor mínimo para saque é R$ {min_saque:.2f}!'}), 400
+    
     # Verificar se o usuário tem saldo suficiente
-    if current_user.saldo < valor:
+    if (current_user.saldo or 0) < valor:
         return jsonify({'message': 'Saldo insuficiente!'}), 400
     
     # Criar novo saque
@@ -102,16 +207,23 @@ def solicitar_saque(current_user):
         valor=valor,
         chave_pix=data['chave_pix']
     )
+    db.session.add(novo_saque)
+    db.session.flush()
+    
+    # Debitar do saldo do usuário (a verificação definitiva é feita no banco)
+    if debitar(current_user.id, valor, 'saque', f'saque:{novo_saque.id}') is None:
+        db.session.rollback()
+        return jsonify({'message': 'Saldo insuficiente!'}), 400
     
-    # Debitar do saldo do usuário
-    current_user.remove_saldo(valor)
+    estatisticas.incrementar(saques_pendentes=1, valor_saques_pendentes=valor)
+    resumo_diario.registrar(novo_saque.data_solicitacao, saques_solicitados=valor)
     
-    # Salvar no banco de dados
-    db.session.add(novo_saque)
+    saque_dict = novo_saque.to_dict()
+    saldo_atual = float(current_user.saldo or 0)
     db.session.commit()
     
     return jsonify({
         'message': 'Saque solicitado com sucesso!',
-        'saque': novo_saque.to_dict(),
-        'saldo_atual': current_user.saldo
+        'saque': saque_dict,
+        'saldo_atual': saldo_atual
     }), 201
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Caches de autenticação por worker: tokens JWT já validados e um resumo
+(UsuarioSnapshot) do usuário autenticado para rotas de leitura.
+
+O resumo não tem saldo, então só muda com o perfil (nome/email, de onde vem
+o is_admin); a rota de perfil o invalida no próprio worker. Nos demais
+workers, e para usuários removidos ou alterados direto no banco, as rotas
+com token_snapshot_required continuam aceitando o resumo antigo por até
+CACHE_AUTH_TTL segundos (60 por padrão). Rotas com token_required sempre
+carregam o usuário do banco.
+"""
+
+import os
+from collections import namedtuple
+
+from src.services.cache import CacheTTL
+
+UsuarioSnapshot = namedtuple("UsuarioSnapshot", ["id", "email", "nome", "is_admin"])
+
+CACHE_AUTH_TTL = int(os.environ.get("CACHE_AUTH_TTL", "60"))
+tokens_cache = CacheTTL(ttl=CACHE_AUTH_TTL, tamanho_maximo=20000)
+usuarios_cache = CacheTTL(ttl=CACHE_AUTH_TTL, tamanho_maximo=20000)
+
+
+def criar_snapshot(user, is_admin):
+    snapshot = UsuarioSnapshot(user.id, user.email, user.nome, is_admin)
+    usuarios_cache.set(user.id, snapshot)
+    return snapshot
+
+
+def invalidar_usuario(user_id):
+    """Descarta o resumo em cache após mudanças de perfil"""
+    usuarios_cache.invalidar(user_id)
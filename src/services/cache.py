@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Cache em memória com validade (TTL), por processo.
+
+Cada worker do gunicorn tem o seu próprio cache; por isso os valores
+guardados aqui devem tolerar ficar desatualizados por até `ttl` segundos
+em outros workers, mesmo com invalidação explícita no worker local.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    def __init__(self, ttl, tamanho_maximo=1024):
+        self.ttl = ttl
+        self.tamanho_maximo = tamanho_maximo
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, chave, padrao=None):
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            if item is _AUSENTE:
+                return padrao
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return padrao
+            self._itens.move_to_end(chave)
+            return valor
+    
+    def set(self, chave, valor, ttl=None):
+        expira_em = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._itens[chave] = (expira_em, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+    
+    def invalidar(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+    
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
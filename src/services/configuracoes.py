@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Cache tipado da tabela `configuracoes`, carregado uma vez por worker.
+
+Toda alteração em Configuracao grava uma `versao` maior que a atual, tirada
+de um contador em `versoes_tabelas`. Cada worker consulta o MAX(versao) no
+máximo a cada CONFIG_INTERVALO_VERIFICACAO segundos e recarrega tudo quando
+ele muda, então uma alteração feita em um worker chega aos demais nesse
+intervalo sem consultar a configuração a cada requisição.
+
+Os valores passam pelo conversor registrado da chave tanto ao serem salvos
+(a rota de admin recusa o que não converte) quanto ao serem carregados.
+"""
+
+import os
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import exc, func, select, update
+
+from src.models.user import db, Configuracao, VersaoTabela
+
+INTERVALO_VERIFICACAO = float(os.getenv('CONFIG_INTERVALO_VERIFICACAO', '5'))
+# Linha de versoes_tabelas com a última versão gravada em Configuracao
+CONTADOR_VERSAO = 'configuracoes'
+
+
+def _bool(valor):
+    return valor.strip().lower() in ('true', '1', 'sim')
+
+
+def _dinheiro(valor):
+    # Decimal aceita NaN, Infinity e negativos; um preço assim quebraria ou
+    # inverteria a cobrança das compras
+    numero = Decimal(valor.strip())
+    if not numero.is_finite() or numero <= 0:
+        raise ValueError('deve ser um valor positivo em reais (ex.: 5.00)')
+    return numero.quantize(Decimal('0.01'))
+
+
+_conversores = {
+    'valor_raspadinha': _dinheiro,
+    'min_saque': _dinheiro,
+    'pix_enabled': _bool,
+    'card_enabled': _bool,
+}
+_lock = threading.Lock()
+_valores = None
+_versao = None
+_verificado_em = 0.0
+
+
+def registrar_tipo(chave, conversor):
+    """Define como o texto de uma configuração é convertido ao ser carregado"""
+    _conversores[chave] = conversor
+    invalidar()
+
+
+def converter(chave, valor):
+    """Converte o texto de uma configuração; levanta ValueError se inválido"""
+    try:
+        return _conversores.get(chave, str)(valor)
+    except (ValueError, TypeError, KeyError, InvalidOperation) as e:
+        raise ValueError(str(e) or type(e).__name__) from e
+
+
+def _carregar():
+    global _valores, _versao, _verificado_em
+    linhas = db.session.execute(select(Configuracao.chave, Configuracao.valor, Configuracao.versao)).all()
+    valores = {}
+    for chave, valor, _ in linhas:
+        try:
+            valores[chave] = converter(chave, valor)
+        except ValueError as e:
+            print(f"Configuração '{chave}' inválida, usando padrão: {e}")
+    with _lock:
+        _valores = valores
+        _versao = max((versao or 0 for _, _, versao in linhas), default=0)
+        _verificado_em = time.monotonic()
+    return valores
+
+
+def _atualizar_se_necessario():
+    """Dict de valores atual; usa uma referência local porque outra thread
+    pode chamar invalidar() a qualquer momento"""
+    global _verificado_em
+    valores = _valores
+    if valores is None:
+        return _carregar()
+    if time.monotonic() - _verificado_em >= INTERVALO_VERIFICACAO:
+        versao = db.session.execute(select(func.max(Configuracao.versao))).scalar() or 0
+        if versao != _versao:
+            return _carregar()
+        _verificado_em = time.monotonic()
+    return valores
+
+
+def obter(chave, padrao=None):
+    """Valor convertido da configuração ou `padrao` se ausente/inválida"""
+    return _atualizar_se_necessario().get(chave, padrao)
+
+
+def invalidar():
+    """Força a recarga na próxima leitura deste worker"""
+    global _valores
+    with _lock:
+        _valores = None
+
+
+def proxima_versao():
+    """Versão a gravar em uma configuração alterada (avisa os outros workers).
+
+    UPDATE ... RETURNING em uma única linha do contador: ela fica bloqueada
+    até o commit, então dois admins nunca gravam a mesma versão.
+    """
+    stmt = (
+        update(VersaoTabela)
+        .where(VersaoTabela.nome == CONTADOR_VERSAO, VersaoTabela.shard == 0)
+        .values(versao=VersaoTabela.versao + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.engine.dialect.update_returning:
+        versao = db.session.execute(stmt.returning(VersaoTabela.versao)).scalar()
+    elif db.session.execute(stmt).rowcount:
+        versao = db.session.execute(
+            select(VersaoTabela.versao).where(VersaoTabela.nome == CONTADOR_VERSAO, VersaoTabela.shard == 0)
+        ).scalar()
+    else:
+        versao = None
+    if versao is not None:
+        return versao
+    # Primeira alteração com o contador: começa acima das versões já gravadas
+    versao = (db.session.execute(select(func.max(Configuracao.versao))).scalar() or 0) + 1
+    try:
+        with db.session.begin_nested():
+            db.session.add(VersaoTabela(nome=CONTADOR_VERSAO, shard=0, versao=versao))
+    except exc.IntegrityError:
+        # Outro admin criou o contador ao mesmo tempo
+        return proxima_versao()
+    return versao
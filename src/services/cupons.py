@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Cupons de parceiros no cadastro.
+
+O índice em memória dos cupons ativos (código -> id) evita uma consulta a
+`partner_coupons` por registro. As rotas de cupons do admin invalidam o
+índice do próprio worker; nos demais, a alteração vale em até
+CACHE_CUPONS_TTL segundos. Se nesse intervalo o cadastro usar um cupom já
+excluído, a chave estrangeira falha e a rota de cadastro recarrega o índice
+e tenta de novo. Os usos são contados em shards
+(PartnerCouponUsageShard) para não serializar os cadastros de um cupom.
+"""
+
+import os
+import random
+
+from sqlalchemy import exc, func, select, update
+
+from src.models.user import db, PartnerCoupon, PartnerCouponUsageShard
+from src.services.cache import CacheTTL
+
+CACHE_CUPONS_TTL = int(os.getenv('CACHE_CUPONS_TTL', '60'))
+NUM_SHARDS_USO = 8
+_indice = CacheTTL(ttl=CACHE_CUPONS_TTL, tamanho_maximo=1)
+
+
+def buscar_cupom_ativo(code):
+    """Id do cupom ativo com este código, ou None"""
+    indice = _indice.get('ativos')
+    if indice is None:
+        indice = dict(db.session.execute(
+            select(PartnerCoupon.code, PartnerCoupon.id).where(PartnerCoupon.is_active.is_(True))
+        ).all())
+        _indice.set('ativos', indice)
+    return indice.get(code)
+
+
+def invalidar():
+    _indice.limpar()
+
+
+def registrar_uso(coupon_id):
+    """Soma um uso ao cupom em um shard aleatório (não faz commit)"""
+    shard = random.randrange(NUM_SHARDS_USO)
+    stmt = (
+        update(PartnerCouponUsageShard)
+        .where(PartnerCouponUsageShard.coupon_id == coupon_id, PartnerCouponUsageShard.shard == shard)
+        .values(count=PartnerCouponUsageShard.count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(stmt).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(PartnerCouponUsageShard(coupon_id=coupon_id, shard=shard, count=1))
+    except exc.IntegrityError:
+        db.session.execute(stmt)
+
+
+def total_usos():
+    """Soma dos usos de todos os cupons (base + shards)"""
+    base = db.session.execute(select(func.sum(PartnerCoupon.usage_count))).scalar() or 0
+    shards = db.session.execute(select(func.sum(PartnerCouponUsageShard.count))).scalar() or 0
+    return base + shards
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Totais acumulados do dashboard administrativo.
+
+As rotas de cadastro, compra, saque e cupons chamam `incrementar` na mesma
+transação da escrita; o dashboard lê a soma dos shards em vez de varrer
+`users`, `jogos`, `saques` e `partner_coupons`. `recalcular` refaz os
+totais a partir das tabelas (carga inicial ou correção) com os shards
+bloqueados, para não perder incrementos feitos durante o recálculo.
+"""
+
+import random
+
+from sqlalchemy import exc, func, select, update
+
+from src.models.user import db, User, Jogo, Saque, PartnerCoupon, Estatisticas
+from src.services import cupons
+from src.services.replica import usar_primario
+
+NUM_SHARDS = 16
+
+CAMPOS = (
+    'total_usuarios', 'total_jogos', 'total_arrecadado', 'total_premios',
+    'saques_pendentes', 'valor_saques_pendentes', 'total_cupons_ativos', 'total_cadastros_cupom',
+)
+
+
+def incrementar(**deltas):
+    """Soma os deltas informados em um shard aleatório"""
+    deltas = {campo: valor for campo, valor in deltas.items() if valor}
+    if not deltas:
+        return
+    shard = random.randrange(NUM_SHARDS)
+    valores = {campo: getattr(Estatisticas, campo) + valor for campo, valor in deltas.items()}
+    stmt = update(Estatisticas).where(Estatisticas.shard == shard).values(**valores)
+    # Sem shards (totais nunca calculados) não há o que incrementar: a
+    # primeira leitura recalcula tudo a partir das tabelas de origem
+    db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def ler():
+    """Retorna os totais somando todos os shards (recalcula se vazio)"""
+    linha = db.session.execute(
+        select(func.count(Estatisticas.shard), *(func.sum(getattr(Estatisticas, c)) for c in CAMPOS))
+    ).one()
+    if not linha[0]:
+        # Recalcula e lê no primário; a réplica ainda não tem os shards
+        usar_primario()
+        # Shards zerados com commit antes do recálculo: as escritas a partir
+        # daqui já os incrementam, e o recálculo espera por elas
+        _criar_shards()
+        db.session.commit()
+        totais = recalcular()
+        db.session.commit()
+        return totais
+    return {campo: valor or 0 for campo, valor in zip(CAMPOS, linha[1:])}
+
+
+def _criar_shards():
+    """Cria, zerados, os shards que ainda não existem"""
+    existentes = set(db.session.scalars(select(Estatisticas.shard)))
+    for shard in range(NUM_SHARDS):
+        if shard in existentes:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(Estatisticas(shard=shard, **{campo: 0 for campo in CAMPOS}))
+        except exc.IntegrityError:
+            pass  # outro worker criou o mesmo shard
+
+
+def recalcular():
+    """Refaz os totais a partir das tabelas de origem (não faz commit).
+
+    Os shards são bloqueados antes da contagem: escritas em andamento
+    terminam antes (e entram na contagem) e as seguintes esperam o commit e
+    somam sobre os novos totais. Os shards são atualizados, não recriados,
+    para que essas escritas ainda encontrem suas linhas.
+    """
+    _criar_shards()
+    db.session.execute(
+        select(Estatisticas.shard).order_by(Estatisticas.shard).with_for_update()
+    ).all()
+    totais = {
+        'total_usuarios': User.query.count(),
+        'total_jogos': Jogo.query.count(),
+        'total_arrecadado': db.session.query(func.sum(Jogo.valor_total)).scalar() or 0,
+        'total_premios': db.session.query(func.sum(Jogo.premio_total)).scalar() or 0,
+        'saques_pendentes': Saque.query.filter_by(status='pendente').count(),
+        'valor_saques_pendentes': db.session.query(func.sum(Saque.valor)).filter_by(status='pendente').scalar() or 0,
+        'total_cupons_ativos': PartnerCoupon.query.filter_by(is_active=True).count(),
+        'total_cadastros_cupom': cupons.total_usos(),
+    }
+    db.session.execute(
+        update(Estatisticas).where(Estatisticas.shard == 0).values(**totais)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        update(Estatisticas).where(Estatisticas.shard != 0).values(**{campo: 0 for campo in CAMPOS})
+        .execution_options(synchronize_session=False)
+    )
+    return totais
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+ETag / If-None-Match para rotas de leitura consultadas com frequência.
+
+O ETag vem de um carimbo de versão barato do usuário e não do corpo da
+resposta: quando o cliente manda o mesmo ETag, a rota devolve 304 sem
+executar as consultas nem serializar nada. As
+respostas levam "Cache-Control: private, no-cache", então o navegador
+sempre revalida e reaproveita o corpo guardado quando recebe 304.
+
+Só as rotas por usuário usam ETag: os relatórios do admin mudam a cada
+compra, e um carimbo para eles custaria uma escrita a mais em toda compra,
+saque e cadastro para quase nunca gerar um 304.
+
+Aplicar abaixo da autenticação e do @leitura_replica, para que o carimbo
+seja lido do mesmo banco que os dados.
+"""
+
+import hashlib
+import os
+from functools import wraps
+
+from flask import make_response, request
+from sqlalchemy import func, select
+
+from src.models.user import db, Jogo, Saque
+
+# Muda a cada deploy no Render; evita reaproveitar respostas de versões
+# anteriores da API com o mesmo carimbo
+VERSAO_API = os.getenv('RENDER_GIT_COMMIT', '')
+
+
+def _calcular(carimbo):
+    bruto = repr((VERSAO_API, request.path, request.query_string, carimbo))
+    return hashlib.sha1(bruto.encode()).hexdigest()
+
+
+def _cabecalhos(resposta, etag):
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    resposta.vary.add('Authorization')
+    return resposta
+
+
+def com_etag(carimbo):
+    """Responde 304 quando If-None-Match bate com o carimbo(current_user)"""
+    def decorador(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            etag = _calcular(carimbo(current_user))
+            if request.if_none_match.contains_weak(etag):
+                return _cabecalhos(make_response('', 304), etag)
+            resposta = make_response(f(current_user, *args, **kwargs))
+            if resposta.status_code == 200:
+                _cabecalhos(resposta, etag)
+            return resposta
+        return decorated
+    return decorador
+
+
+def carimbo_perfil(user):
+    # O perfil sai da linha do usuário já carregada pela autenticação
+    return (
+        user.id, user.nome, user.email, user.telefone, str(user.saldo), user.data_cadastro,
+        user.ultimo_login, user.referral_code, user.referral_count, user.bonus_raspadinhas_available,
+    )
+
+
+def carimbo_historico(user):
+    # Jogos não são alterados depois de criados: basta o mais recente
+    return user.id, db.session.execute(
+        select(Jogo.id)
+        .where(Jogo.user_id == user.id)
+        .order_by(Jogo.data_jogo.desc(), Jogo.id.desc())
+        .limit(1)
+    ).scalar()
+
+
+def carimbo_saques(user):
+    return user.id, tuple(db.session.execute(
+        select(func.count(Saque.id), func.max(Saque.id), func.sum(Saque.versao))
+        .where(Saque.user_id == user.id)
+    ).one())
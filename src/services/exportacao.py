@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Exportação em streaming (CSV ou NDJSON) de consultas grandes.
+
+As linhas são lidas em lotes com cursor no servidor (`stream_results` +
+`yield_per`) e escritas na resposta conforme chegam, sem carregar objetos
+ORM nem a listagem inteira em memória.
+
+No CSV, textos que começam com =, +, -, @, tab ou CR ganham um ' na frente
+para não serem executados como fórmula ao abrir o arquivo em uma planilha
+(a chave Pix e os emails vêm do usuário).
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from flask import Response, stream_with_context
+
+from src.models.user import db
+
+FORMATOS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+TAMANHO_LOTE = 1000
+INICIOS_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _valor(valor):
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+
+def _celula_csv(valor):
+    if isinstance(valor, str) and valor.startswith(INICIOS_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def _linhas(stmt):
+    resultado = db.session.execute(stmt.execution_options(stream_results=True, yield_per=TAMANHO_LOTE))
+    for particao in resultado.partitions():
+        yield [[_valor(v) for v in linha] for linha in particao]
+
+
+def _gerar_csv(stmt, colunas):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(colunas)
+    for lote in _linhas(stmt):
+        writer.writerows([_celula_csv(v) for v in linha] for linha in lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _gerar_ndjson(stmt, colunas):
+    for lote in _linhas(stmt):
+        yield ''.join(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + '\n' for linha in lote)
+
+
+def exportar(stmt, formato, nome_arquivo):
+    """Resposta em streaming para um select de colunas (não entidades ORM)"""
+    colunas = [coluna.key for coluna in stmt.selected_columns]
+    gerador = _gerar_csv if formato == 'csv' else _gerar_ndjson
+    return Response(
+        stream_with_context(gerador(stmt, colunas)),
+        mimetype=FORMATOS[formato],
+        headers={'Content-Disposition': f'attachment; filename={nome_arquivo}.{formato}'}
+    )
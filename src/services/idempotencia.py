@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Suporte ao cabeçalho Idempotency-Key nas rotas de escrita.
+
+Antes de executar a rota, a chave é reservada em `idempotency_keys` (a
+restrição única por usuário impede que duas tentativas simultâneas executem
+a compra/saque). Respostas de sucesso ficam gravadas e são devolvidas nas
+repetições, primeiro a partir de um LRU em memória e depois do banco. Junto
+com a chave vai um hash do corpo: repetir a chave com outro corpo é
+recusado com 422 em vez de devolver a resposta da requisição original.
+
+Uma reserva sem resposta gravada responde 409 enquanto a requisição
+original pode estar em andamento. Se o worker morreu no meio dela, a
+reserva fica pendente; passado IDEMPOTENCIA_PRAZO_RESERVA (acima do timeout
+do gunicorn) a próxima tentativa com o mesmo corpo assume a chave.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, jsonify, request
+from sqlalchemy import delete, exc, insert, select, update
+
+from src.models.user import db, ChaveIdempotencia
+
+CABECALHO = 'Idempotency-Key'
+TAMANHO_MAXIMO_CHAVE = 100
+VALIDADE_CHAVE = timedelta(hours=24)
+# Reservas pendentes mais antigas que isso são de requisições que não
+# terminaram (o gunicorn derruba a requisição após 30s por padrão)
+PRAZO_RESERVA = timedelta(seconds=int(os.getenv('IDEMPOTENCIA_PRAZO_RESERVA', '120')))
+TAMANHO_CACHE = 2048
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(chave):
+    with _cache_lock:
+        item = _cache.get(chave)
+        if item is not None:
+            _cache.move_to_end(chave)
+        return item
+
+
+def _cache_set(chave, item):
+    with _cache_lock:
+        _cache[chave] = item
+        _cache.move_to_end(chave)
+        while len(_cache) > TAMANHO_CACHE:
+            _cache.popitem(last=False)
+
+
+def _resposta_gravada(resposta, status_code):
+    return Response(resposta, status=status_code, mimetype='application/json', headers={'Idempotent-Replayed': 'true'})
+
+
+def _impressao():
+    """Hash do corpo da requisição, para recusar a mesma chave com outro payload"""
+    return hashlib.sha256(request.get_data()).hexdigest()
+
+
+def _reservar(user_id, chave, rota, impressao, momento):
+    """Reserva a chave; retorna None se reservada ou o registro já existente.
+
+    Usa uma conexão própria: um commit na sessão da requisição expiraria o
+    current_user e o que a rota já tivesse carregado.
+    """
+    try:
+        with db.engine.begin() as conexao:
+            conexao.execute(insert(ChaveIdempotencia).values(
+                user_id=user_id, chave=chave, rota=rota, impressao=impressao, criado_em=momento
+            ))
+        return None
+    except exc.IntegrityError:
+        pass
+    with db.engine.begin() as conexao:
+        existente = conexao.execute(
+            select(ChaveIdempotencia.rota, ChaveIdempotencia.impressao, ChaveIdempotencia.status_code,
+                   ChaveIdempotencia.resposta, ChaveIdempotencia.criado_em)
+            .where(ChaveIdempotencia.user_id == user_id, ChaveIdempotencia.chave == chave)
+        ).first()
+        if existente is not None and existente.criado_em >= momento - VALIDADE_CHAVE:
+            abandonada = existente.status_code is None and existente.criado_em < momento - PRAZO_RESERVA
+            mesma_requisicao = existente.rota == rota and existente.impressao in (None, impressao)
+            if abandonada and mesma_requisicao and _assumir(conexao, user_id, chave, impressao, momento):
+                return None
+            return existente
+        # Chave expirada (ou removida entre o insert e o select): libera para reutilização
+        conexao.execute(delete(ChaveIdempotencia).where(
+            ChaveIdempotencia.user_id == user_id, ChaveIdempotencia.chave == chave
+        ))
+    return _reservar(user_id, chave, rota, impressao, momento)
+
+
+def _assumir(conexao, user_id, chave, impressao, momento):
+    """Assume uma reserva pendente vencida; só uma tentativa concorrente consegue"""
+    resultado = conexao.execute(
+        update(ChaveIdempotencia)
+        .where(
+            ChaveIdempotencia.user_id == user_id,
+            ChaveIdempotencia.chave == chave,
+            ChaveIdempotencia.status_code.is_(None),
+            ChaveIdempotencia.criado_em < momento - PRAZO_RESERVA,
+        )
+        .values(impressao=impressao, criado_em=momento)
+    )
+    return resultado.rowcount == 1
+
+
+def _finalizar(user_id, chave, **valores):
+    with db.engine.begin() as conexao:
+        conexao.execute(
+            update(ChaveIdempotencia)
+            .where(ChaveIdempotencia.user_id == user_id, ChaveIdempotencia.chave == chave)
+            .values(**valores)
+        )
+
+
+def _liberar(user_id, chave):
+    with db.engine.begin() as conexao:
+        conexao.execute(delete(ChaveIdempotencia).where(
+            ChaveIdempotencia.user_id == user_id, ChaveIdempotencia.chave == chave
+        ))
+
+
+def idempotente(rota):
+    """Decorator para rotas já protegidas por token_required"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            chave = request.headers.get(CABECALHO)
+            if not chave:
+                return f(current_user, *args, **kwargs)
+            if len(chave) > TAMANHO_MAXIMO_CHAVE:
+                return jsonify({'message': f'{CABECALHO} deve ter no máximo {TAMANHO_MAXIMO_CHAVE} caracteres!'}), 400
+            
+            user_id = current_user.id
+            impressao = _impressao()
+            momento = datetime.utcnow()
+            cache_key = (user_id, chave)
+            gravada = _cache_get(cache_key)
+            if gravada is not None and gravada[:2] == (rota, impressao) and gravada[4] >= momento - VALIDADE_CHAVE:
+                return _resposta_gravada(*gravada[2:4])
+            
+            existente = _reservar(user_id, chave, rota, impressao, momento)
+            if existente is not None:
+                if existente.rota != rota:
+                    return jsonify({'message': f'{CABECALHO} já utilizada em outra operação!'}), 422
+                if existente.impressao is not None and existente.impressao != impressao:
+                    return jsonify({'message': f'{CABECALHO} já utilizada com outros dados!'}), 422
+                if existente.status_code is None:
+                    return jsonify({'message': 'Requisição com esta chave ainda em processamento!'}), 409
+                _cache_set(cache_key, (rota, impressao, existente.resposta, existente.status_code, existente.criado_em))
+                return _resposta_gravada(existente.resposta, existente.status_code)
+            
+            try:
+                resultado = f(current_user, *args, **kwargs)
+            except Exception:
+                db.session.rollback()
+                _liberar(user_id, chave)
+                raise
+            
+            resposta, status_code = resultado if isinstance(resultado, tuple) else (resultado, 200)
+            if 200 <= status_code < 300:
+                corpo = resposta.get_data(as_text=True)
+                _finalizar(user_id, chave, status_code=status_code, resposta=corpo)
+                _cache_set(cache_key, (rota, impressao, corpo, status_code, momento))
+            else:
+                # Erros não são gravados: o cliente pode tentar de novo com a mesma chave
+                _liberar(user_id, chave)
+            return resultado
+        return decorated
+    return decorator
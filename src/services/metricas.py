@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas por endpoint: quantidade de consultas SQL, tempo no banco e tempo
+total de cada requisição.
+
+As durações das consultas vêm de src/services/tempo_consultas.py; as feitas
+dentro de uma requisição são somadas e os hooks do Flask agregam os números
+por endpoint. O resultado fica em memória, por processo, e é exposto em
+formato texto do Prometheus na rota /api/admin/metricas. Com
+METRICAS_SERVER_TIMING=true cada resposta também leva o cabeçalho
+Server-Timing (db, app e total).
+
+Com vários workers do gunicorn cada coleta é atendida por um deles, então
+toda série leva o rótulo worker (PID do processo) e os totais da aplicação
+saem de sum() sobre os workers. O coletor autentica com
+"Authorization: Bearer <METRICAS_TOKEN>", sem precisar de um JWT de admin.
+"""
+
+import hmac
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+
+from src.services import tempo_consultas
+
+METRICAS_ATIVAS = os.getenv('METRICAS_ATIVAS', 'true').lower() == 'true'
+SERVER_TIMING = os.getenv('METRICAS_SERVER_TIMING', 'false').lower() == 'true'
+# Token do coletor (Prometheus); sem ele a rota só aceita o admin
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+
+# Limites (em segundos) dos buckets de latência e de consultas por requisição
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+_requisicoes = defaultdict(int)     # (endpoint, metodo, status) -> total
+_endpoints = {}                     # endpoint -> _Agregado
+
+
+class _Agregado:
+    __slots__ = ('contagem', 'soma_total', 'soma_db', 'soma_consultas', 'latencia', 'consultas')
+
+    def __init__(self):
+        self.contagem = 0
+        self.soma_total = 0.0
+        self.soma_db = 0.0
+        self.soma_consultas = 0
+        self.latencia = [0] * len(BUCKETS_LATENCIA)
+        self.consultas = [0] * len(BUCKETS_CONSULTAS)
+
+
+def _registrar_consulta(duracao, statement):
+    if has_request_context() and 'metricas_inicio' in g:
+        g.metricas_db += duracao
+        g.metricas_consultas += 1
+
+
+def _iniciar_requisicao():
+    g.metricas_inicio = time.perf_counter()
+    g.metricas_db = 0.0
+    g.metricas_consultas = 0
+
+
+def _finalizar_requisicao(response):
+    inicio = g.pop('metricas_inicio', None)
+    if inicio is None:
+        return response
+    total = time.perf_counter() - inicio
+    endpoint = request.endpoint or 'desconhecido'
+    registrar(endpoint, request.method, response.status_code, total, g.metricas_db, g.metricas_consultas)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = (
+            f'db;dur={g.metricas_db * 1000:.1f};desc="{g.metricas_consultas} consultas", '
+            f'app;dur={(total - g.metricas_db) * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'
+        )
+    return response
+
+
+def registrar(endpoint, metodo, status, total, tempo_db, consultas):
+    """Acumula os números de uma requisição nas métricas do processo"""
+    with _lock:
+        _requisicoes[(endpoint, metodo, status)] += 1
+        agregado = _endpoints.get(endpoint)
+        if agregado is None:
+            agregado = _endpoints[endpoint] = _Agregado()
+        agregado.contagem += 1
+        agregado.soma_total += total
+        agregado.soma_db += tempo_db
+        agregado.soma_consultas += consultas
+        for i, limite in enumerate(BUCKETS_LATENCIA):
+            if total <= limite:
+                agregado.latencia[i] += 1
+        for i, limite in enumerate(BUCKETS_CONSULTAS):
+            if consultas <= limite:
+                agregado.consultas[i] += 1
+
+
+def instalar(app):
+    """Liga os hooks de requisição e a medição das consultas no app"""
+    if not METRICAS_ATIVAS:
+        return
+    tempo_consultas.assinar(_registrar_consulta)
+    app.before_request(_iniciar_requisicao)
+    app.after_request(_finalizar_requisicao)
+
+
+def token_valido(cabecalho):
+    """Confere o cabeçalho Authorization do coletor com o METRICAS_TOKEN"""
+    if not METRICAS_TOKEN or not cabecalho:
+        return False
+    return hmac.compare_digest(cabecalho.encode(), f'Bearer {METRICAS_TOKEN}'.encode())
+
+
+def _histograma(linhas, nome, rotulos, buckets, contagens, contagem, soma):
+    for limite, valor in zip(buckets, contagens):
+        linhas.append(f'{nome}_bucket{{{rotulos},le="{limite}"}} {valor}')
+    linhas.append(f'{nome}_bucket{{{rotulos},le="+Inf"}} {contagem}')
+    linhas.append(f'{nome}_sum{{{rotulos}}} {soma}')
+    linhas.append(f'{nome}_count{{{rotulos}}} {contagem}')
+
+
+def exportar_prometheus():
+    """Métricas do processo no formato texto do Prometheus"""
+    # Lido a cada coleta: os workers do gunicorn são criados por fork
+    worker = os.getpid()
+    with _lock:
+        requisicoes = sorted(_requisicoes.items())
+        endpoints = sorted(_endpoints.items())
+        linhas = [
+            '# HELP raspadinha_http_requests_total Requisições atendidas.',
+            '# TYPE raspadinha_http_requests_total counter',
+        ]
+        for (endpoint, metodo, status), total in requisicoes:
+            linhas.append(f'raspadinha_http_requests_total{{endpoint="{endpoint}",method="{metodo}",status="{status}",worker="{worker}"}} {total}')
+
+        linhas += [
+            '# HELP raspadinha_http_request_duration_seconds Tempo total da requisição.',
+            '# TYPE raspadinha_http_request_duration_seconds histogram',
+        ]
+        for endpoint, a in endpoints:
+            _histograma(linhas, 'raspadinha_http_request_duration_seconds', f'endpoint="{endpoint}",worker="{worker}"',
+                        BUCKETS_LATENCIA, a.latencia, a.contagem, round(a.soma_total, 6))
+
+        linhas += [
+            '# HELP raspadinha_db_queries_per_request Consultas SQL por requisição.',
+            '# TYPE raspadinha_db_queries_per_request histogram',
+        ]
+        for endpoint, a in endpoints:
+            _histograma(linhas, 'raspadinha_db_queries_per_request', f'endpoint="{endpoint}",worker="{worker}"',
+                        BUCKETS_CONSULTAS, a.consultas, a.contagem, a.soma_consultas)
+
+        linhas += [
+            '# HELP raspadinha_db_time_seconds_total Tempo gasto no banco.',
+            '# TYPE raspadinha_db_time_seconds_total counter',
+        ]
+        for endpoint, a in endpoints:
+            linhas.append(f'raspadinha_db_time_seconds_total{{endpoint="{endpoint}",worker="{worker}"}} {round(a.soma_db, 6)}')
+    return '\n'.join(linhas) + '\n'
+
+
+def limpar():
+    """Zera as métricas do processo"""
+    with _lock:
+        _requisicoes.clear()
+        _endpoints.clear()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Backends de pagamento de saques via Pix.
+
+O backend é escolhido pela variável PAGAMENTO_BACKEND no formato
+"modulo:Classe" (padrão: backend falso, que apenas registra o pagamento).
+`pagar` deve levantar ErroPagamento quando o pagamento não foi feito; o
+id do saque deve ser usado como chave de idempotência no provedor, pois um
+saque pode ser reenviado se o worker cair no meio do lote.
+"""
+
+import importlib
+import os
+import random
+
+
+class ErroPagamento(Exception):
+    pass
+
+
+class BackendPagamento:
+    def pagar(self, saque):
+        raise NotImplementedError
+
+
+class BackendPagamentoFalso(BackendPagamento):
+    """Backend local para testes; falha em `taxa_falha` dos pagamentos"""
+    
+    def __init__(self, taxa_falha=None):
+        self.taxa_falha = float(os.getenv('PAGAMENTO_FALSO_TAXA_FALHA', '0') if taxa_falha is None else taxa_falha)
+        self.pagos = []
+    
+    def pagar(self, saque):
+        if self.taxa_falha and random.random() < self.taxa_falha:
+            raise ErroPagamento(f'Falha simulada no pagamento do saque {saque.id}')
+        self.pagos.append(saque.id)
+        print(f"[pagamento falso] saque {saque.id}: R$ {saque.valor} para {saque.chave_pix}")
+
+
+def carregar_backend(caminho=None):
+    caminho = caminho or os.getenv('PAGAMENTO_BACKEND', 'src.services.pagamentos:BackendPagamentoFalso')
+    modulo, classe = caminho.split(':')
+    return getattr(importlib.import_module(modulo), classe)()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Paginação por cursor (keyset) para listagens ordenadas por (data, id).
+
+O cursor é opaco para o cliente: base64 de "<data ISO>|<id>" do último item
+da página anterior. A próxima página começa estritamente depois dele, sem
+OFFSET, então o custo não cresce com a profundidade da página.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from src.models.user import db
+
+
+def codificar_cursor(data, id_):
+    bruto = f"{data.isoformat()}|{id_}".encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (datetime, id) ou levanta ValueError se o cursor for inválido"""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        data, id_ = bruto.rsplit('|', 1)
+        return datetime.fromisoformat(data), int(id_)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Cursor inválido') from e
+
+
+def filtro_apos(coluna_data, coluna_id, cursor):
+    """Condição para itens depois do cursor na ordem (data desc, id desc)"""
+    data, id_ = decodificar_cursor(cursor)
+    return or_(coluna_data < data, and_(coluna_data == data, coluna_id < id_))
+
+
+def pagina_keyset(query, coluna_data, coluna_id, cursor, limite):
+    """Aplica cursor, ordenação e limite; retorna (itens, próximo cursor ou None)"""
+    if cursor:
+        query = query.filter(filtro_apos(coluna_data, coluna_id, cursor))
+    itens = query.order_by(coluna_data.desc(), coluna_id.desc()).limit(limite + 1).all()
+    proximo = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        ultimo = itens[-1]
+        proximo = codificar_cursor(getattr(ultimo, coluna_data.key), getattr(ultimo, coluna_id.key))
+    return itens, proximo
+
+
+def estimar_total(query):
+    """Total aproximado de linhas da consulta, pelas estatísticas do planejador.
+
+    Disponível no PostgreSQL (EXPLAIN); nos demais bancos retorna a contagem
+    exata.
+    """
+    query = query.order_by(None)
+    if db.engine.dialect.name != 'postgresql':
+        return query.count()
+    compilado = query.statement.compile(dialect=db.engine.dialect)
+    plano = db.session.connection().exec_driver_sql(
+        'EXPLAIN (FORMAT JSON) ' + str(compilado), compilado.params
+    ).scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return int(plano[0]['Plan']['Plan Rows'])
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Modo de profiling para produção, ligado com PERFIL_ATIVO=true.
+
+- Amostragem de pilha: em PERFIL_AMOSTRAGEM % das requisições, uma thread
+  de fundo lê a pilha da thread da requisição a cada PERFIL_INTERVALO_MS e
+  conta as pilhas no formato "colapsado" (func1;func2;func3), pronto para
+  gerar flamegraphs.
+- Consultas lentas: em qualquer requisição, consultas SQL acima de
+  PERFIL_CONSULTA_LENTA_MS são registradas com o trecho do código da
+  aplicação que as disparou (útil para achar lazy loads em to_dict()).
+  Os parâmetros das consultas não são gravados.
+
+Os registros vão, um JSON por linha com o endpoint, para PERFIL_ARQUIVO,
+que é rotacionado ao atingir PERFIL_ARQUIVO_MB.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import g, has_request_context, request
+
+from src.services import tempo_consultas
+
+PERFIL_ATIVO = os.getenv('PERFIL_ATIVO', 'false').lower() == 'true'
+PERFIL_AMOSTRAGEM = float(os.getenv('PERFIL_AMOSTRAGEM', '1'))
+PERFIL_INTERVALO_MS = float(os.getenv('PERFIL_INTERVALO_MS', '5'))
+PERFIL_CONSULTA_LENTA_MS = float(os.getenv('PERFIL_CONSULTA_LENTA_MS', '100'))
+PERFIL_ARQUIVO = os.getenv('PERFIL_ARQUIVO', 'perfil.log')
+PERFIL_ARQUIVO_MB = float(os.getenv('PERFIL_ARQUIVO_MB', '10'))
+PERFIL_ARQUIVO_BACKUPS = int(os.getenv('PERFIL_ARQUIVO_BACKUPS', '5'))
+
+MAX_PILHAS = 30       # pilhas mais frequentes gravadas por requisição
+MAX_SQL = 2000        # caracteres da consulta gravados
+
+_logger = logging.getLogger('raspadinha.perfil')
+_lock = threading.Lock()
+_amostras = {}        # id da thread -> Counter de pilhas colapsadas
+_amostrador = None
+# Arquivos que não entram no trecho da aplicação de uma consulta lenta
+_ARQUIVOS_PROPRIOS = {__file__, tempo_consultas.__file__}
+
+
+def _gravar(registro):
+    _logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+
+def _colapsar(frame):
+    partes = []
+    while frame is not None:
+        codigo = frame.f_code
+        partes.append(f'{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(partes))
+
+
+def _amostrar():
+    intervalo = PERFIL_INTERVALO_MS / 1000
+    while True:
+        time.sleep(intervalo)
+        with _lock:
+            if not _amostras:
+                continue
+            frames = sys._current_frames()
+            for thread_id, contador in _amostras.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    contador[_colapsar(frame)] += 1
+
+
+def _iniciar_amostrador():
+    global _amostrador
+    with _lock:
+        if _amostrador is None:
+            _amostrador = threading.Thread(target=_amostrar, name='perfilador', daemon=True)
+            _amostrador.start()
+
+
+def _trecho_aplicacao():
+    """Frames da aplicação (src/) que levaram à consulta atual"""
+    trecho = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        arquivo = frame.f_code.co_filename
+        if f'{os.sep}src{os.sep}' in arquivo and arquivo not in _ARQUIVOS_PROPRIOS:
+            trecho.append(f'{os.path.basename(arquivo)}:{frame.f_lineno} {frame.f_code.co_name}')
+        frame = frame.f_back
+    return list(reversed(trecho))
+
+
+def _registrar_consulta(duracao, statement):
+    duracao_ms = duracao * 1000
+    if duracao_ms < PERFIL_CONSULTA_LENTA_MS:
+        return
+    _gravar({
+        'tipo': 'consulta_lenta',
+        'momento': datetime.utcnow().isoformat(),
+        'endpoint': request.endpoint if has_request_context() else None,
+        'duracao_ms': round(duracao_ms, 2),
+        'sql': statement[:MAX_SQL],
+        'origem': _trecho_aplicacao(),
+    })
+
+
+def _iniciar_requisicao():
+    if random.random() * 100 >= PERFIL_AMOSTRAGEM:
+        return
+    g.perfil_inicio = time.perf_counter()
+    with _lock:
+        _amostras[threading.get_ident()] = Counter()
+
+
+def _finalizar_requisicao(response):
+    inicio = g.pop('perfil_inicio', None)
+    if inicio is None:
+        return response
+    with _lock:
+        contador = _amostras.pop(threading.get_ident(), Counter())
+    _gravar({
+        'tipo': 'amostra',
+        'momento': datetime.utcnow().isoformat(),
+        'endpoint': request.endpoint,
+        'metodo': request.method,
+        'status': response.status_code,
+        'duracao_ms': round((time.perf_counter() - inicio) * 1000, 2),
+        'intervalo_ms': PERFIL_INTERVALO_MS,
+        'total_amostras': sum(contador.values()),
+        'pilhas': dict(contador.most_common(MAX_PILHAS)),
+    })
+    return response
+
+
+def _descartar_amostra(exc):
+    # Requisições que terminaram em exceção não passam pelo after_request
+    with _lock:
+        _amostras.pop(threading.get_ident(), None)
+
+
+def instalar(app):
+    """Liga o modo de profiling no app, se PERFIL_ATIVO=true"""
+    if not PERFIL_ATIVO:
+        return
+    if not _logger.handlers:
+        handler = RotatingFileHandler(
+            PERFIL_ARQUIVO,
+            maxBytes=int(PERFIL_ARQUIVO_MB * 1024 * 1024),
+            backupCount=PERFIL_ARQUIVO_BACKUPS,
+            encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        tempo_consultas.assinar(_registrar_consulta)
+    app.before_request(_iniciar_requisicao)
+    app.after_request(_finalizar_requisicao)
+    app.teardown_request(_descartar_amostra)
+    _iniciar_amostrador()
+    print(f"Perfilador ativo: {PERFIL_AMOSTRAGEM}% das requisições, consultas acima de "
+          f"{PERFIL_CONSULTA_LENTA_MS}ms, gravando em {PERFIL_ARQUIVO}")
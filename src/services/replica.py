@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Roteamento de leituras para uma réplica do banco.
+
+Quando DATABASE_REPLICA_URL está configurada, ela é registrada como o bind
+'replica'. Nas rotas marcadas com @leitura_replica (relatórios, listagens
+do admin e históricos), os SELECTs sem FOR UPDATE vão para a réplica;
+escritas, flushes e SELECT ... FOR UPDATE continuam no primário. Sem a
+variável, tudo usa o primário.
+
+O decorator fica abaixo do token_snapshot_required para que a carga do
+usuário autenticado continue sendo feita no primário. Rotas que escrevem e
+releem o que acabaram de escrever (ex.: recálculo dos totais na primeira
+leitura) chamam `usar_primario` antes, pois a réplica pode estar atrasada.
+"""
+
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import Select
+
+BIND_REPLICA = 'replica'
+
+
+class SessaoRoteada(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+            and has_app_context()
+            and g.get('usar_replica')
+        ):
+            replica = self._db.engines.get(BIND_REPLICA)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def leitura_replica(f):
+    """Envia as consultas de leitura da rota para a réplica, se configurada"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.usar_replica = True
+        return f(*args, **kwargs)
+    return decorated
+
+
+def usar_primario():
+    """Envia as consultas seguintes da requisição para o primário"""
+    if has_app_context():
+        g.usar_replica = False
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Armazenamento compacto dos resultados de um jogo.
+
+Em vez de uma linha em `raspadinhas` por cartela, o jogo guarda um único
+blob no formato:
+
+    versão (1 byte) | k (1 byte) | k prêmios em centavos (uint32 LE)
+    | n (uint16 LE) | n índices (1 byte cada) | bitmap de extras (ceil(n/8))
+"""
+
+import struct
+from decimal import Decimal
+
+VERSAO = 1
+CENTAVOS = Decimal('100')
+
+
+def codificar(premios, extras):
+    """Codifica listas paralelas de prêmios (Decimal) e extras (bool)"""
+    valores = sorted(set(premios))
+    if len(valores) > 255:
+        raise ValueError('Resultado compacto suporta no máximo 255 prêmios distintos')
+    posicao = {valor: i for i, valor in enumerate(valores)}
+    n = len(premios)
+    
+    bitmap = bytearray((n + 7) // 8)
+    for i, extra in enumerate(extras):
+        if extra:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    
+    return b''.join((
+        struct.pack('<BB', VERSAO, len(valores)),
+        struct.pack(f'<{len(valores)}I', *(int(v * CENTAVOS) for v in valores)),
+        struct.pack('<H', n),
+        bytes(posicao[p] for p in premios),
+        bytes(bitmap),
+    ))
+
+
+def decodificar(dados):
+    """Retorna a lista de (prêmio Decimal, extra bool) gravada no blob"""
+    versao, k = struct.unpack_from('<BB', dados, 0)
+    if versao != VERSAO:
+        raise ValueError(f'Versão de resultado compacto desconhecida: {versao}')
+    valores = [(Decimal(c) / CENTAVOS).quantize(Decimal('0.01')) for c in struct.unpack_from(f'<{k}I', dados, 2)]
+    inicio = 2 + 4 * k
+    (n,) = struct.unpack_from('<H', dados, inicio)
+    indices = dados[inicio + 2:inicio + 2 + n]
+    bitmap = dados[inicio + 2 + n:]
+    return [(valores[indice], bool(bitmap[i >> 3] & (1 << (i & 7)))) for i, indice in enumerate(indices)]
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Resumo diário usado pelo relatório financeiro e pelos números de 7 dias do
+dashboard.
+
+As rotas de escrita chamam `registrar` na mesma transação; o relatório soma
+no máximo NUM_SHARDS linhas por dia do período em vez de varrer `jogos` e
+`saques`. `recalcular` refaz um intervalo a partir das tabelas de origem;
+o histórico completo é calculado uma vez no deploy (migrar_schema.py,
+init_db.py ou backfill_resumo_diario.py) e fica marcado em versoes_tabelas.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import exc, func, literal, select, type_coerce, union_all, update
+
+from src.models.user import db, User, Jogo, Saque, ResumoDiario, VersaoTabela
+
+NUM_SHARDS = 4
+# Linha de versoes_tabelas que marca o histórico como já calculado
+MARCADOR = 'resumo_diario'
+
+CAMPOS = (
+    'total_arrecadado', 'total_premios', 'quantidade_jogos', 'quantidade_raspadinhas',
+    'saques_solicitados', 'saques_concluidos', 'novos_usuarios',
+)
+TIPOS = {campo: getattr(ResumoDiario, campo).type for campo in CAMPOS}
+
+
+def registrar(momento, **deltas):
+    """Soma os deltas ao dia de `momento` (datetime UTC; padrão: agora)"""
+    deltas = {campo: valor for campo, valor in deltas.items() if valor}
+    if not deltas:
+        return
+    _somar_no_shard((momento or datetime.utcnow()).date(), random.randrange(NUM_SHARDS), deltas)
+
+
+def _somar_no_shard(dia, shard, deltas):
+    stmt = (
+        update(ResumoDiario)
+        .where(ResumoDiario.dia == dia, ResumoDiario.shard == shard)
+        .values(**{campo: getattr(ResumoDiario, campo) + valor for campo, valor in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(stmt).rowcount:
+        return
+    # Primeira movimentação do dia neste shard; outro worker pode inserir
+    # a mesma linha ao mesmo tempo, por isso o savepoint
+    try:
+        with db.session.begin_nested():
+            db.session.add(ResumoDiario(dia=dia, shard=shard, **{**{c: 0 for c in CAMPOS}, **deltas}))
+    except exc.IntegrityError:
+        db.session.execute(stmt)
+
+
+def somar(inicio, fim):
+    """Soma os totais dos dias em [inicio, fim) (objetos date)"""
+    linha = db.session.execute(
+        select(*(func.sum(getattr(ResumoDiario, c)) for c in CAMPOS))
+        .where(ResumoDiario.dia >= inicio, ResumoDiario.dia < fim)
+    ).one()
+    return {campo: valor or 0 for campo, valor in zip(CAMPOS, linha)}
+
+
+def calculado():
+    """Se o histórico completo já foi calculado ao menos uma vez"""
+    return db.session.execute(
+        select(VersaoTabela.versao).where(VersaoTabela.nome == MARCADOR, VersaoTabela.shard == 0)
+    ).first() is not None
+
+
+def _marcar_calculado():
+    try:
+        with db.session.begin_nested():
+            db.session.add(VersaoTabela(nome=MARCADOR, shard=0, versao=1))
+    except exc.IntegrityError:
+        pass  # Outro processo marcou ao mesmo tempo
+
+
+def recalcular(inicio=None, fim=None):
+    """Refaz os dias em [inicio, fim) a partir de jogos, saques e users.
+
+    Sem datas, refaz todo o histórico e marca o resumo como calculado.
+    Retorna quantos dias foram corrigidos. Não faz commit.
+
+    Uma única consulta soma as tabelas de origem e subtrai o que o resumo
+    já tem, dia a dia; a diferença é somada no shard 0 como em `registrar`.
+    Por ser uma só consulta, uma compra que ainda não fez commit fica fora
+    dos dois lados e soma o próprio delta depois, então o recálculo pode
+    rodar com o site no ar sem perder nem contar em dobro.
+    """
+    def periodo(coluna):
+        filtros = []
+        if inicio:
+            filtros.append(coluna >= datetime.combine(inicio, datetime.min.time()))
+        if fim:
+            filtros.append(coluna < datetime.combine(fim, datetime.min.time()))
+        return filtros
+    
+    def por_dia(coluna, filtros=(), **agregados):
+        # Mesmas colunas em todas as partes do UNION; as ausentes valem 0
+        colunas = [func.date(coluna).label('dia')]
+        colunas += [type_coerce(agregados.get(c, literal(0)), TIPOS[c]).label(c) for c in CAMPOS]
+        return select(*colunas).where(coluna.is_not(None), *filtros).group_by(func.date(coluna))
+    
+    partes = union_all(
+        por_dia(Jogo.data_jogo, periodo(Jogo.data_jogo),
+                total_arrecadado=func.sum(Jogo.valor_total), total_premios=func.sum(Jogo.premio_total),
+                quantidade_jogos=func.count(Jogo.id), quantidade_raspadinhas=func.sum(Jogo.quantidade_raspadinhas)),
+        por_dia(Saque.data_solicitacao, periodo(Saque.data_solicitacao), saques_solicitados=func.sum(Saque.valor)),
+        por_dia(Saque.data_processamento, [Saque.status == 'concluido', *periodo(Saque.data_processamento)],
+                saques_concluidos=func.sum(Saque.valor)),
+        por_dia(User.data_cadastro, periodo(User.data_cadastro), novos_usuarios=func.count(User.id)),
+        # O que já está no resumo entra negativo
+        select(ResumoDiario.dia.label('dia'), *(
+            type_coerce(-func.sum(getattr(ResumoDiario, c)), TIPOS[c]).label(c) for c in CAMPOS
+        )).where(*(
+            ([ResumoDiario.dia >= inicio] if inicio else []) + ([ResumoDiario.dia < fim] if fim else [])
+        )).group_by(ResumoDiario.dia),
+    ).subquery()
+    diferencas = db.session.execute(
+        select(partes.c.dia, *(type_coerce(func.sum(partes.c[c]), TIPOS[c]) for c in CAMPOS))
+        .group_by(partes.c.dia)
+    ).all()
+    
+    dias = 0
+    for dia, *valores in diferencas:
+        if isinstance(dia, str):
+            dia = datetime.strptime(dia, '%Y-%m-%d').date()
+        deltas = {campo: valor for campo, valor in zip(CAMPOS, valores) if valor}
+        if deltas:
+            _somar_no_shard(dia, 0, deltas)
+            dias += 1
+    if inicio is None and fim is None:
+        _marcar_calculado()
+    return dias
+
+
+def ultimos_dias(dias):
+    """Soma dos últimos `dias` dias, incluindo hoje"""
+    hoje = datetime.utcnow().date()
+    return somar(hoje - timedelta(days=dias - 1), hoje + timedelta(days=1))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Movimentação atômica do saldo dos usuários.
+
+Débitos e créditos são um único UPDATE condicional no banco, sem ler o
+saldo em Python, e cada movimentação gera um lançamento em `ledger`. Assim
+dois workers não perdem atualizações nem deixam o saldo negativo. As funções
+não fazem commit: participam da transação da requisição.
+"""
+
+from decimal import Decimal
+
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from src.models.user import db, User, Movimentacao
+
+# Usuários por UPDATE nas operações em lote
+TAMANHO_BLOCO = 1000
+
+
+def _aplicar(user_id, delta, condicao=None):
+    """Soma `delta` ao saldo; retorna o novo saldo ou None se a condição falhar"""
+    stmt = (
+        update(User)
+        .where(User.id == user_id)
+        .values(saldo=func.coalesce(User.saldo, 0) + delta)
+        .execution_options(synchronize_session=False)
+    )
+    if condicao is not None:
+        stmt = stmt.where(condicao)
+    if db.engine.dialect.update_returning:
+        novo_saldo = db.session.execute(stmt.returning(User.saldo)).scalar()
+    elif db.session.execute(stmt).rowcount == 1:
+        novo_saldo = db.session.execute(select(User.saldo).where(User.id == user_id)).scalar()
+    else:
+        novo_saldo = None
+    if novo_saldo is not None:
+        # Mantém o objeto já carregado na sessão coerente com o banco
+        usuario = db.session.identity_map.get(identity_key(User, user_id))
+        if usuario is not None:
+            set_committed_value(usuario, 'saldo', novo_saldo)
+    return novo_saldo
+
+
+def _registrar(user_id, tipo, valor, saldo_apos, referencia):
+    db.session.add(Movimentacao(
+        user_id=user_id, tipo=tipo, valor=valor, saldo_apos=saldo_apos, referencia=referencia
+    ))
+
+
+def debitar(user_id, valor, tipo, referencia=None):
+    """Debita `valor` somente se houver saldo; retorna o novo saldo ou None"""
+    valor = Decimal(valor)
+    novo_saldo = _aplicar(user_id, -valor, func.coalesce(User.saldo, 0) >= valor)
+    if novo_saldo is not None:
+        _registrar(user_id, tipo, -valor, novo_saldo, referencia)
+    return novo_saldo
+
+
+def creditar(user_id, valor, tipo, referencia=None):
+    """Credita `valor` ao saldo; retorna o novo saldo"""
+    valor = Decimal(valor)
+    novo_saldo = _aplicar(user_id, valor)
+    if novo_saldo is not None:
+        _registrar(user_id, tipo, valor, novo_saldo, referencia)
+    return novo_saldo
+
+
+def creditar_em_lote(creditos, tipo):
+    """Credita vários lançamentos de uma vez: [(user_id, valor, referencia)] -> {user_id: novo saldo}
+
+    Um único UPDATE com CASE por bloco de usuários (somando os lançamentos
+    de cada um) e um INSERT de várias linhas no extrato, uma por lançamento.
+    """
+    totais = {}
+    for user_id, valor, _ in creditos:
+        totais[user_id] = totais.get(user_id, 0) + Decimal(valor)
+    
+    novos_saldos = {}
+    user_ids = list(totais)
+    for inicio in range(0, len(user_ids), TAMANHO_BLOCO):
+        bloco = user_ids[inicio:inicio + TAMANHO_BLOCO]
+        delta = case({user_id: totais[user_id] for user_id in bloco}, value=User.id, else_=0)
+        stmt = (
+            update(User)
+            .where(User.id.in_(bloco))
+            .values(saldo=func.coalesce(User.saldo, 0) + delta)
+            .execution_options(synchronize_session=False)
+        )
+        if db.engine.dialect.update_returning:
+            linhas = db.session.execute(stmt.returning(User.id, User.saldo)).all()
+        else:
+            db.session.execute(stmt)
+            linhas = db.session.execute(select(User.id, User.saldo).where(User.id.in_(bloco))).all()
+        novos_saldos.update(dict(linhas))
+    
+    # saldo_apos de cada lançamento: o saldo final menos os lançamentos seguintes do mesmo usuário
+    lancamentos = []
+    saldos = dict(novos_saldos)
+    for user_id, valor, referencia in reversed(creditos):
+        if user_id in saldos:
+            lancamentos.append({'user_id': user_id, 'tipo': tipo, 'valor': Decimal(valor),
+                                'saldo_apos': saldos[user_id], 'referencia': referencia})
+            saldos[user_id] -= Decimal(valor)
+    if lancamentos:
+        db.session.execute(insert(Movimentacao), lancamentos[::-1])
+    for user_id, saldo in novos_saldos.items():
+        usuario = db.session.identity_map.get(identity_key(User, user_id))
+        if usuario is not None:
+            set_committed_value(usuario, 'saldo', saldo)
+    return novos_saldos
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Transições de status dos saques e fila de pagamento.
+
+`transicionar` concentra os efeitos de uma mudança de status (estorno no
+cancelamento, totais do dashboard e resumo diário) para a rota do admin e o
+worker. A fila é a própria tabela `saques`: o worker reivindica lotes de
+saques pendentes com SELECT ... FOR UPDATE SKIP LOCKED e os marca como
+'processando' com um prazo (`bloqueado_ate`); se o worker morrer, os saques
+voltam a ser reivindicáveis quando o prazo expira.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from src.models.user import db, Saque
+from src.services import estatisticas, resumo_diario
+from src.services.saldo import creditar, creditar_em_lote, TAMANHO_BLOCO
+
+STATUS_VALIDOS = ["pendente", "processando", "concluido", "cancelado"]
+# Origem -> destinos permitidos. 'processando' só sai pelo worker (pago ou
+# de volta à fila) e saques concluídos ou cancelados não mudam mais: cancelar
+# um saque pago ou em pagamento estornaria dinheiro que já saiu, e reabrir um
+# cancelado pagaria um saque já estornado.
+TRANSICOES_PERMITIDAS = {
+    "pendente": {"processando", "concluido", "cancelado"},
+    "processando": {"pendente", "concluido"},
+    "concluido": set(),
+    "cancelado": set(),
+}
+TAMANHO_ERRO = 255
+ESPERA_RETENTATIVA = timedelta(minutes=1)
+ESPERA_MAXIMA = timedelta(hours=1)
+
+
+def _efeitos(saque_id, user_id, valor, status_anterior, novo_status, momento):
+    if novo_status == "cancelado":
+        creditar(user_id, valor, "estorno_saque", f"saque:{saque_id}")
+    if (status_anterior == "pendente") != (novo_status == "pendente"):
+        sinal = 1 if novo_status == "pendente" else -1
+        estatisticas.incrementar(saques_pendentes=sinal, valor_saques_pendentes=sinal * valor)
+    if novo_status == "concluido":
+        resumo_diario.registrar(momento, saques_concluidos=valor)
+
+
+def transicionar(saque, novo_status):
+    """Aplica a mudança de status e seus efeitos (não faz commit).
+
+    Levanta ValueError se a transição não for permitida; mudar para o
+    próprio status não faz nada.
+    """
+    if novo_status == saque.status:
+        return
+    if novo_status not in TRANSICOES_PERMITIDAS.get(saque.status, ()):
+        raise ValueError(f"Não é possível mudar um saque de '{saque.status}' para '{novo_status}'")
+    momento = datetime.utcnow()
+    _efeitos(saque.id, saque.user_id, saque.valor, saque.status, novo_status, momento)
+    saque.status = novo_status
+    if novo_status in ["concluido", "cancelado"]:
+        saque.data_processamento = momento
+
+
+def reivindicar_lote(tamanho, prazo):
+    """Marca até `tamanho` saques como 'processando' para este worker e faz commit"""
+    agora = datetime.utcnow()
+    ids = db.session.scalars(
+        select(Saque.id)
+        .where(or_(
+            and_(Saque.status == "pendente", or_(Saque.bloqueado_ate.is_(None), Saque.bloqueado_ate < agora)),
+            and_(Saque.status == "processando", Saque.bloqueado_ate < agora),
+        ))
+        .order_by(Saque.data_solicitacao, Saque.id)
+        .limit(tamanho)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not ids:
+        db.session.commit()
+        return []
+    saques = Saque.query.filter(Saque.id.in_(ids)).order_by(Saque.data_solicitacao, Saque.id).all()
+    for saque in saques:
+        transicionar(saque, "processando")
+        saque.bloqueado_ate = agora + prazo
+    db.session.commit()
+    return saques
+
+
+def _finalizar(saque, novo_status, **valores):
+    """Tira o saque de 'processando' só se ele ainda estiver nesse status.
+
+    O commit da reivindicação solta o bloqueio da linha, então o status é
+    conferido no próprio UPDATE. Retorna False se o saque mudou nesse meio
+    tempo; nesse caso nada é alterado.
+    """
+    momento = datetime.utcnow()
+    if novo_status == "concluido":
+        valores["data_processamento"] = momento
+    resultado = db.session.execute(
+        update(Saque)
+        .where(Saque.id == saque.id, Saque.status == "processando")
+        .values(status=novo_status, **valores)
+        .execution_options(synchronize_session="fetch")
+    )
+    if resultado.rowcount != 1:
+        print(f"Saque {saque.id} mudou de status durante o pagamento; resultado ignorado")
+        return False
+    _efeitos(saque.id, saque.user_id, saque.valor, "processando", novo_status, momento)
+    return True
+
+
+def processar_lote(backend, tamanho=50, prazo=timedelta(minutes=10)):
+    """Reivindica e paga um lote; retorna (concluídos, com falha)"""
+    concluidos = falhas = 0
+    for saque in reivindicar_lote(tamanho, prazo):
+        try:
+            backend.pagar(saque)
+        except Exception as e:
+            db.session.rollback()
+            tentativas = (saque.tentativas or 0) + 1
+            # Volta para a fila, mas só é tentado de novo após uma espera crescente
+            if _finalizar(saque, "pendente",
+                          tentativas=tentativas,
+                          ultimo_erro=str(e)[:TAMANHO_ERRO],
+                          bloqueado_ate=datetime.utcnow() + min(ESPERA_RETENTATIVA * tentativas, ESPERA_MAXIMA)):
+                falhas += 1
+        else:
+            if _finalizar(saque, "concluido", bloqueado_ate=None, ultimo_erro=None):
+                concluidos += 1
+        db.session.commit()
+    return concluidos, falhas
+
+
+def transicionar_em_lote(condicoes, novo_status):
+    """Muda o status de todos os saques que atendem `condicoes` (não faz commit).
+
+    Os saques afetados são lidos e bloqueados em uma única consulta; status,
+    estornos, extrato, totais e resumo diário são atualizados com comandos
+    sobre o conjunto inteiro. Só entram saques cujo status atual pode ir para
+    `novo_status` (TRANSICOES_PERMITIDAS); os demais são ignorados. Retorna a
+    quantidade de saques alterados.
+    """
+    origens = [status for status, destinos in TRANSICOES_PERMITIDAS.items() if novo_status in destinos]
+    if not origens:
+        return 0
+    linhas = db.session.execute(
+        select(Saque.id, Saque.user_id, Saque.valor, Saque.status)
+        .where(*condicoes, Saque.status.in_(origens))
+        .with_for_update()
+    ).all()
+    if not linhas:
+        return 0
+    
+    agora = datetime.utcnow()
+    valores = {"status": novo_status}
+    if novo_status in ["concluido", "cancelado"]:
+        valores["data_processamento"] = agora
+    ids = [linha.id for linha in linhas]
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        db.session.execute(
+            update(Saque).where(Saque.id.in_(ids[inicio:inicio + TAMANHO_BLOCO])).values(**valores)
+            .execution_options(synchronize_session="fetch")
+        )
+    
+    if novo_status == "cancelado":
+        creditar_em_lote(
+            [(linha.user_id, linha.valor, f"saque:{linha.id}") for linha in linhas], "estorno_saque"
+        )
+    
+    pendentes = [linha for linha in linhas if linha.status == "pendente"]
+    if novo_status == "pendente":
+        estatisticas.incrementar(saques_pendentes=len(linhas), valor_saques_pendentes=sum(l.valor for l in linhas))
+    elif pendentes:
+        estatisticas.incrementar(saques_pendentes=-len(pendentes), valor_saques_pendentes=-sum(l.valor for l in pendentes))
+    
+    if novo_status == "concluido":
+        resumo_diario.registrar(agora, saques_concluidos=sum(l.valor for l in linhas))
+    return len(linhas)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Política de hash de senhas.
+
+PASSWORD_HASH_METHOD define o método do Werkzeug usado nos novos hashes
+(ex.: "scrypt:32768:8:1" ou "pbkdf2:sha256:600000"); sem ela vale o padrão
+do Werkzeug. Hashes gravados com outro método são refeitos no próximo login
+bem-sucedido.
+
+Todo cálculo de hash (cadastro, login, rehash e troca de senha) passa por
+um limite de concorrência por processo, PASSWORD_HASH_MAX_SIMULTANEOS. O
+cálculo continua na thread da requisição; o limite só impede que uma rajada
+de logins ponha todas as threads do worker para calcular hashes ao mesmo
+tempo, e as demais esperam a vez.
+"""
+
+import os
+import threading
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+METODO_HASH = os.getenv('PASSWORD_HASH_METHOD') or None
+MAX_HASHES_SIMULTANEOS = int(os.getenv('PASSWORD_HASH_MAX_SIMULTANEOS', '2'))
+
+_limite_hashes = threading.BoundedSemaphore(MAX_HASHES_SIMULTANEOS)
+_metodo_completo = None
+
+
+def _metodo_atual():
+    global _metodo_completo
+    if _metodo_completo is None:
+        # O Werkzeug grava a forma expandida do método ("scrypt" vira
+        # "scrypt:32768:8:1"); descobre essa forma gerando um hash vazio
+        _metodo_completo = gerar_hash('').split('$', 1)[0]
+    return _metodo_completo
+
+
+def gerar_hash(senha):
+    with _limite_hashes:
+        if METODO_HASH:
+            return generate_password_hash(senha, method=METODO_HASH)
+        return generate_password_hash(senha)
+
+
+def verificar(password_hash, senha):
+    with _limite_hashes:
+        return check_password_hash(password_hash, senha)
+
+
+def precisa_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _metodo_atual()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Serialização rápida para as listagens da API.
+
+- Planos por modelo: cada Plano lista (chave, coluna, conversão) uma única
+  vez. As listagens selecionam só essas colunas (sem hidratar objetos do
+  ORM) e montam os dicts direto das linhas, com a mesma saída dos to_dict()
+  dos modelos (conferido em tests/test_serializacao.py).
+- ProvedorJSON: provedor JSON do Flask que usa orjson quando instalado e
+  cai no encoder padrão caso contrário. Mantém chaves ordenadas e os mesmos
+  tipos aceitos pelo provedor padrão.
+"""
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+
+from src.models.user import db, User, Jogo, Raspadinha, Saque
+from src.services import resultado_compacto
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson é opcional
+    orjson = None
+
+if orjson is not None:
+    OPCOES_ORJSON = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+def _data(valor):
+    # Mesmo texto de strftime('%Y-%m-%d %H:%M:%S'), bem mais barato
+    return valor.isoformat(' ', 'seconds')
+
+
+def _data_opcional(valor):
+    return valor.isoformat(' ', 'seconds') if valor is not None else None
+
+
+def _float_ou_zero(valor):
+    return float(valor) if valor else 0.0
+
+
+def _texto_opcional(valor):
+    return str(valor) if valor is not None else None
+
+
+class Plano:
+    """Campos de saída de um modelo: (chave, coluna[, conversão])"""
+
+    def __init__(self, *campos):
+        self.chaves = tuple(campo[0] for campo in campos)
+        self.colunas = tuple(campo[1] for campo in campos)
+        self._conversoes = tuple((campo[0], campo[2]) for campo in campos if len(campo) > 2)
+
+    def linha(self, row):
+        item = dict(zip(self.chaves, row))
+        for chave, conversao in self._conversoes:
+            item[chave] = conversao(item[chave])
+        return item
+
+    def linhas(self, rows):
+        return [self.linha(row) for row in rows]
+
+
+# Mesma saída de User.to_dict(), Jogo.to_dict(), Raspadinha.to_dict() e Saque.to_dict()
+PLANO_USUARIO = Plano(
+    ('id', User.id),
+    ('nome', User.nome),
+    ('email', User.email),
+    ('telefone', User.telefone),
+    ('saldo', User.saldo, _float_ou_zero),
+    ('data_cadastro', User.data_cadastro, _data),
+    ('ultimo_login', User.ultimo_login, _data_opcional),
+    ('referral_code', User.referral_code),
+    ('referral_count', User.referral_count),
+    ('bonus_raspadinhas_available', User.bonus_raspadinhas_available),
+)
+
+PLANO_JOGO = Plano(
+    ('id', Jogo.id),
+    ('user_id', Jogo.user_id),
+    ('quantidade_raspadinhas', Jogo.quantidade_raspadinhas),
+    ('valor_total', Jogo.valor_total, float),
+    ('premio_total', Jogo.premio_total, float),
+    ('data_jogo', Jogo.data_jogo, _data),
+    ('origem_saldo', Jogo.origem_saldo),
+    ('usou_bonus', Jogo.usou_bonus),
+    ('semente', Jogo.semente, _texto_opcional),
+    ('ticket_book_id', Jogo.ticket_book_id),
+)
+
+# Colunas para listar jogos com as raspadinhas (o resultado compacto não vai na saída)
+COLUNAS_JOGO_DETALHES = PLANO_JOGO.colunas + (Jogo.resultado_compacto,)
+
+PLANO_RASPADINHA = Plano(
+    ('id', Raspadinha.id),
+    ('jogo_id', Raspadinha.jogo_id),
+    ('premio', Raspadinha.premio, float),
+    ('extra', Raspadinha.extra),
+)
+
+PLANO_SAQUE = Plano(
+    ('id', Saque.id),
+    ('user_id', Saque.user_id),
+    ('valor', Saque.valor, float),
+    ('chave_pix', Saque.chave_pix),
+    ('status', Saque.status),
+    ('data_solicitacao', Saque.data_solicitacao, _data),
+    ('data_processamento', Saque.data_processamento, _data_opcional),
+)
+
+
+def jogos(rows, incluir_raspadinhas=True):
+    """Serializa linhas de jogos; com raspadinhas, as linhas devem ter as
+    COLUNAS_JOGO_DETALHES e as raspadinhas de todos os jogos vêm em uma
+    única consulta"""
+    itens = PLANO_JOGO.linhas(rows)
+    if not incluir_raspadinhas:
+        return itens
+
+    ids = [row.id for row in rows if row.resultado_compacto is None]
+    por_jogo = {}
+    if ids:
+        stmt = (
+            select(*PLANO_RASPADINHA.colunas)
+            .where(Raspadinha.jogo_id.in_(ids))
+            .order_by(Raspadinha.jogo_id, Raspadinha.id)
+        )
+        for row in db.session.execute(stmt):
+            por_jogo.setdefault(row.jogo_id, []).append(PLANO_RASPADINHA.linha(row))
+
+    for item, row in zip(itens, rows):
+        if row.resultado_compacto is not None:
+            item['raspadinhas'] = [
+                {'id': None, 'jogo_id': row.id, 'premio': float(premio), 'extra': extra}
+                for premio, extra in resultado_compacto.decodificar(row.resultado_compacto)
+            ]
+        else:
+            item['raspadinhas'] = por_jogo.get(row.id, [])
+    return itens
+
+
+class ProvedorJSON(DefaultJSONProvider):
+    """Provedor JSON do app: orjson quando disponível, senão o padrão do Flask"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=OPCOES_ORJSON).decode()
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=OPCOES_ORJSON),
+            mimetype=self.mimetype
+        )
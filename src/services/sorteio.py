@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de sorteio das raspadinhas no servidor.
+
+Os resultados de um jogo são gerados em uma única passada a partir da tabela
+de prêmios guardada em Configuracao ('tabela_premios') e de uma semente
+própria do jogo, o que permite reproduzir qualquer jogo a partir do banco.
+"""
+
+import json
+import math
+import random
+import secrets
+from array import array
+from collections import namedtuple
+from decimal import Decimal
+from itertools import accumulate
+
+from src.services import configuracoes
+
+CHAVE_TABELA_PREMIOS = 'tabela_premios'
+
+# Bit alto de cada bilhete de um livro: raspadinha extra (os 7 bits baixos
+# são o índice do prêmio)
+BIT_EXTRA = 0x80
+
+# Mesma distribuição usada pelo frontend (raspadinha-enhanced.js):
+# 30% sem prêmio e 70% distribuídos entre os valores abaixo.
+TABELA_PREMIOS_PADRAO = {
+    'premios': ['0.00', '5.00', '10.00', '20.00', '50.00', '100.00', '500.00'],
+    'pesos': [300, 350, 175, 105, 49, 17.5, 3.5],
+    'chance_extra': 0.0,
+}
+
+TabelaPremios = namedtuple('TabelaPremios', ['premios', 'pesos_acumulados', 'chance_extra'])
+Sorteio = namedtuple('Sorteio', ['semente', 'indices', 'extras', 'premios', 'premio_total'])
+
+
+def montar_tabela(dados):
+    """Valida e pré-processa uma tabela de prêmios no formato de Configuracao"""
+    premios = [Decimal(str(p)) for p in dados['premios']]
+    pesos = [float(p) for p in dados['pesos']]
+    if not premios or len(premios) != len(pesos):
+        raise ValueError('Tabela de prêmios deve ter a mesma quantidade de prêmios e pesos')
+    if len(premios) > 256:
+        raise ValueError('Tabela de prêmios suporta no máximo 256 faixas')
+    if not all(p.is_finite() for p in premios) or not all(math.isfinite(p) for p in pesos):
+        raise ValueError('Prêmios e pesos devem ser números finitos')
+    if any(p < 0 for p in premios) or any(p < 0 for p in pesos) or sum(pesos) <= 0:
+        raise ValueError('Prêmios e pesos não podem ser negativos')
+    chance_extra = float(dados.get('chance_extra', 0) or 0)
+    if not 0 <= chance_extra <= 1:
+        raise ValueError('chance_extra deve estar entre 0 e 1')
+    return TabelaPremios(tuple(premios), list(accumulate(pesos)), chance_extra)
+
+
+TABELA_PADRAO = montar_tabela(TABELA_PREMIOS_PADRAO)
+
+configuracoes.registrar_tipo(CHAVE_TABELA_PREMIOS, lambda valor: montar_tabela(json.loads(valor)))
+
+
+def carregar_tabela_premios():
+    """Tabela de prêmios configurada (em cache), ou a padrão se ausente ou inválida"""
+    return configuracoes.obter(CHAVE_TABELA_PREMIOS) or TABELA_PADRAO
+
+
+def nova_semente():
+    """Gera uma semente aleatória que cabe em uma coluna BIGINT"""
+    return secrets.randbits(63)
+
+
+def sortear_raspadinhas(quantidade, tabela, semente=None):
+    """Sorteia `quantidade` raspadinhas de uma vez.
+
+    Com a mesma semente e a mesma tabela o resultado é sempre idêntico.
+    """
+    if semente is None:
+        semente = nova_semente()
+    rng = random.Random(semente)
+    indices = array('B', rng.choices(range(len(tabela.premios)), cum_weights=tabela.pesos_acumulados, k=quantidade))
+    if tabela.chance_extra > 0:
+        extras = [x < tabela.chance_extra for x in (rng.random() for _ in range(quantidade))]
+    else:
+        extras = [False] * quantidade
+    premios = [tabela.premios[i] for i in indices]
+    return Sorteio(semente, indices, extras, premios, sum(premios, Decimal('0.00')))
+
+
+def gerar_bilhetes(total, tabela, semente=None):
+    """Gera um livro de `total` bilhetes com a distribuição exata da tabela.
+
+    A quantidade de cada faixa é proporcional ao peso (maiores restos), de
+    forma que o pagamento total do livro é conhecido antes da venda.
+    Retorna (semente, bilhetes em bytes, prêmio total).
+    """
+    if len(tabela.premios) > BIT_EXTRA:
+        raise ValueError('Livros de bilhetes suportam no máximo 128 faixas')
+    if semente is None:
+        semente = nova_semente()
+    pesos = [b - a for a, b in zip([0] + tabela.pesos_acumulados[:-1], tabela.pesos_acumulados)]
+    soma = tabela.pesos_acumulados[-1]
+    cotas = [total * p / soma for p in pesos]
+    contagens = [int(c) for c in cotas]
+    faltam = total - sum(contagens)
+    for i in sorted(range(len(cotas)), key=lambda i: cotas[i] - contagens[i], reverse=True)[:faltam]:
+        contagens[i] += 1
+    
+    bilhetes = array('B')
+    for indice, contagem in enumerate(contagens):
+        bilhetes.extend([indice] * contagem)
+    rng = random.Random(semente)
+    rng.shuffle(bilhetes)
+    if tabela.chance_extra > 0:
+        for i in range(total):
+            if rng.random() < tabela.chance_extra:
+                bilhetes[i] |= BIT_EXTRA
+    premio_total = sum((tabela.premios[i] * c for i, c in enumerate(contagens)), Decimal('0.00'))
+    return semente, bilhetes.tobytes(), premio_total
+
+
+def decodificar_bilhetes(dados, premios):
+    """Converte bytes de bilhetes em um Sorteio (sem semente própria)"""
+    indices = array('B', (b & (BIT_EXTRA - 1) for b in dados))
+    extras = [bool(b & BIT_EXTRA) for b in dados]
+    valores = [premios[i] for i in indices]
+    return Sorteio(None, indices, extras, valores, sum(valores, Decimal('0.00')))
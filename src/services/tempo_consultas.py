@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Duração das consultas SQL, medida uma única vez para as métricas e o
+perfilador.
+
+O before_cursor_execute empilha o início da consulta em `conn.info` e o
+after_cursor_execute desempilha e avisa os assinantes. Quando a consulta
+falha o after não é chamado: o handle_error desempilha o início dela, senão
+as consultas seguintes da mesma conexão seriam medidas a partir do início
+errado.
+"""
+
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CHAVE = 'tempo_consultas_inicio'
+
+_assinantes = []
+_lock = threading.Lock()
+_instalado = False
+
+
+def _antes_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(CHAVE, []).append((cursor, time.perf_counter()))
+
+
+def _depois_consulta(conn, cursor, statement, parameters, context, executemany):
+    pilha = conn.info.get(CHAVE)
+    if not pilha:
+        return
+    duracao = time.perf_counter() - pilha.pop()[1]
+    for assinante in _assinantes:
+        assinante(duracao, statement)
+
+
+def _erro_consulta(contexto):
+    conn = contexto.connection
+    execucao = contexto.execution_context
+    if conn is None or execucao is None:
+        return
+    pilha = conn.info.get(CHAVE)
+    # Só desempilha se o erro veio da consulta que está no topo
+    if pilha and pilha[-1][0] is execucao.cursor:
+        pilha.pop()
+
+
+def assinar(funcao):
+    """Chama funcao(duração em segundos, sql) ao fim de cada consulta"""
+    global _instalado
+    with _lock:
+        if not _instalado:
+            event.listen(Engine, 'before_cursor_execute', _antes_consulta)
+            event.listen(Engine, 'after_cursor_execute', _depois_consulta)
+            event.listen(Engine, 'handle_error', _erro_consulta)
+            _instalado = True
+        if funcao not in _assinantes:
+            _assinantes.append(funcao)
+
+
+def cancelar(funcao):
+    """Remove um assinante; os listeners continuam instalados"""
+    with _lock:
+        if funcao in _assinantes:
+            _assinantes.remove(funcao)
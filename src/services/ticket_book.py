@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Livros de bilhetes pré-gerados (TicketBook).
+
+Um livro é embaralhado uma única vez na criação; a venda apenas avança o
+cursor do livro com um UPDATE condicional, reservando um intervalo contínuo
+de bilhetes numa transação curta, separada da compra.
+"""
+
+import json
+from decimal import Decimal
+
+from sqlalchemy import func, select, update
+
+from src.models.user import db, TicketBook
+from src.services.sorteio import gerar_bilhetes, decodificar_bilhetes
+
+# Tentativas de reserva quando outro worker esgota o livro escolhido
+MAX_TENTATIVAS_RESERVA = 3
+# Limites de bilhetes por livro: gerado na rota do admin (cabe com folga no
+# timeout do gunicorn) e pelo script gerar_ticket_book.py
+MAX_BILHETES_POR_REQUISICAO = 500_000
+MAX_BILHETES_POR_LIVRO = 5_000_000
+
+
+def criar_livro(total, tabela):
+    """Gera e adiciona à sessão um novo livro de bilhetes"""
+    semente, bilhetes, premio_total = gerar_bilhetes(total, tabela)
+    livro = TicketBook(
+        total=total,
+        cursor=0,
+        tabela_premios=json.dumps({'premios': [str(p) for p in tabela.premios]}),
+        premio_total=premio_total,
+        semente=semente,
+        bilhetes=bilhetes
+    )
+    db.session.add(livro)
+    return livro
+
+
+def _avancar_cursor(conexao, livro_id, quantidade):
+    """Avança o cursor do livro atomicamente; retorna o novo cursor ou None"""
+    stmt = (
+        update(TicketBook)
+        .where(TicketBook.id == livro_id, TicketBook.cursor + quantidade <= TicketBook.total)
+        .values(cursor=TicketBook.cursor + quantidade)
+    )
+    if db.engine.dialect.update_returning:
+        return conexao.execute(stmt.returning(TicketBook.cursor)).scalar()
+    # MySQL não tem RETURNING: a linha fica bloqueada pela própria transação
+    # após o UPDATE, então a leitura seguinte enxerga o valor reservado.
+    if conexao.execute(stmt).rowcount != 1:
+        return None
+    return conexao.execute(select(TicketBook.cursor).where(TicketBook.id == livro_id)).scalar()
+
+
+def reservar_bilhetes(quantidade):
+    """Reserva `quantidade` bilhetes do livro ativo mais antigo.
+
+    Retorna (livro_id, inicio, Sorteio) ou None se nenhum livro ativo tiver
+    bilhetes suficientes. A reserva é gravada numa transação própria e curta:
+    a linha do livro não fica bloqueada durante o resto da compra, e uma
+    compra que falhar depois apenas descarta os bilhetes reservados.
+    """
+    for _ in range(MAX_TENTATIVAS_RESERVA):
+        with db.engine.begin() as conexao:
+            livro = conexao.execute(
+                select(TicketBook.id, TicketBook.tabela_premios)
+                .where(TicketBook.ativo.is_(True), TicketBook.total - TicketBook.cursor >= quantidade)
+                .order_by(TicketBook.id)
+                .limit(1)
+            ).first()
+            if not livro:
+                return None
+            fim = _avancar_cursor(conexao, livro.id, quantidade)
+            if fim is None:
+                continue
+            inicio = fim - quantidade
+            dados = conexao.execute(
+                select(func.substr(TicketBook.bilhetes, inicio + 1, quantidade)).where(TicketBook.id == livro.id)
+            ).scalar()
+        premios = [Decimal(p) for p in json.loads(livro.tabela_premios)['premios']]
+        return livro.id, inicio, decodificar_bilhetes(bytes(dados), premios)
+    return None
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Registro do último login sem uma escrita por login.
+
+Logins de quem já tem `ultimo_login` mais recente que
+ULTIMO_LOGIN_INTERVALO segundos não gravam nada. Os demais ficam em memória
+no worker e são gravados juntos, em um único UPDATE, quando o buffer tem
+mais de ULTIMO_LOGIN_FLUSH segundos ou muitos usuários. A gravação é feita
+pela própria requisição de login que encontra o buffer vencido; se o worker
+for encerrado antes, perdem-se apenas esses horários pendentes.
+"""
+
+import os
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import case, update
+
+from src.models.user import db, User
+
+INTERVALO_MINIMO = timedelta(seconds=int(os.getenv('ULTIMO_LOGIN_INTERVALO', '900')))
+INTERVALO_FLUSH = float(os.getenv('ULTIMO_LOGIN_FLUSH', '30'))
+MAX_PENDENTES = 500
+
+_pendentes = {}
+_lock = threading.Lock()
+_ultimo_flush = time.monotonic()
+
+
+def registrar(user, agora):
+    """Anota o login; retorna False se o valor gravado ainda é recente"""
+    if user.ultimo_login and agora - user.ultimo_login < INTERVALO_MINIMO:
+        return False
+    with _lock:
+        _pendentes[user.id] = agora
+    return True
+
+
+def flush_se_necessario():
+    with _lock:
+        vencido = time.monotonic() - _ultimo_flush >= INTERVALO_FLUSH
+        if not _pendentes or not (vencido or len(_pendentes) >= MAX_PENDENTES):
+            return 0
+    return flush()
+
+
+def flush():
+    """Grava todos os horários pendentes em um único UPDATE e faz commit"""
+    global _pendentes, _ultimo_flush
+    with _lock:
+        pendentes, _pendentes = _pendentes, {}
+        _ultimo_flush = time.monotonic()
+    if not pendentes:
+        return 0
+    try:
+        db.session.execute(
+            update(User)
+            .where(User.id.in_(list(pendentes)))
+            .values(ultimo_login=case(pendentes, value=User.id, else_=User.ultimo_login))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao gravar último login: {e}")
+        with _lock:
+            for user_id, momento in pendentes.items():
+                _pendentes.setdefault(user_id, momento)
+        return 0
+    return len(pendentes)
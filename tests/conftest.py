@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures dos testes: app com um banco SQLite temporário, recriado a cada
+teste, e usuários com token JWT.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import jwt
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'testes.sqlite')
+
+
+@event.listens_for(Engine, 'connect')
+def _chaves_estrangeiras(conexao, registro):
+    # O SQLite só verifica chaves estrangeiras com este pragma, como o PostgreSQL faz sempre
+    conexao.execute('PRAGMA foreign_keys=ON')
+
+
+from src.main import app as aplicacao
+from src.models.user import db, Movimentacao, User
+from src.routes.admin import ADMIN_EMAIL
+from src.routes.auth import SECRET_KEY
+from src.services import autenticacao, configuracoes, cupons, idempotencia
+
+
+@pytest.fixture
+def app():
+    with aplicacao.app_context():
+        db.drop_all()
+        db.create_all()
+    autenticacao.tokens_cache.limpar()
+    autenticacao.usuarios_cache.limpar()
+    idempotencia._cache.clear()
+    configuracoes.invalidar()
+    cupons.invalidar()
+    with aplicacao.app_context():
+        yield aplicacao
+        db.session.rollback()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def criar_usuario(app):
+    """Cria um usuário e retorna (id, cabeçalhos com o token)"""
+    def criar(email='usuario@teste.com', saldo=100):
+        usuario = User(nome='Usuário', email=email, telefone='(11) 99999-9999', saldo=saldo)
+        usuario.set_password('senha123')
+        db.session.add(usuario)
+        db.session.commit()
+        token = jwt.encode({'user_id': usuario.id, 'exp': time.time() + 3600}, SECRET_KEY, algorithm='HS256')
+        return usuario.id, {'Authorization': f'Bearer {token}'}
+    return criar
+
+
+@pytest.fixture
+def admin(criar_usuario):
+    return criar_usuario(ADMIN_EMAIL, saldo=0)[1]
+
+
+def saldo_de(user_id):
+    db.session.expire_all()
+    return db.session.get(User, user_id).saldo
+
+
+def solicitar_saque(client, headers, valor):
+    """Solicita um saque pela API e retorna o id"""
+    resposta = client.post('/api/jogos/solicitar-saque', json={'valor': valor, 'chave_pix': 'chave'}, headers=headers)
+    assert resposta.status_code == 201
+    return resposta.get_json()['saque']['id']
+
+
+def estornos():
+    return [m.referencia for m in Movimentacao.query.filter_by(tipo='estorno_saque').order_by(Movimentacao.id)]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+import pytest
+
+from src.models.user import Configuracao
+from src.services import configuracoes
+from src.services.sorteio import TABELA_PREMIOS_PADRAO, carregar_tabela_premios
+
+
+def salvar(client, admin, chave, valor):
+    return client.post('/api/admin/configuracoes', json={'chave': chave, 'valor': valor}, headers=admin)
+
+
+@pytest.mark.parametrize('valor', ['5,00', '-5', '0', 'NaN', 'Infinity', '', 'abc'])
+def test_preco_invalido_e_recusado(client, admin, valor):
+    resposta = salvar(client, admin, 'valor_raspadinha', valor)
+    assert resposta.status_code == 400
+    assert Configuracao.query.filter_by(chave='valor_raspadinha').first() is None
+
+
+@pytest.mark.parametrize('valor', ['{"premios": ["5.00"]}', '{"premios": ["5.00", "NaN"], "pesos": [1, 1]}',
+                                   '{"premios": ["5.00"], "pesos": [NaN]}', 'não é json', '[1, 2]'])
+def test_tabela_de_premios_invalida_e_recusada(client, admin, valor):
+    assert salvar(client, admin, 'tabela_premios', valor).status_code == 400
+    assert Configuracao.query.filter_by(chave='tabela_premios').first() is None
+
+
+def test_valores_validos_sao_salvos_e_carregados(client, admin):
+    assert salvar(client, admin, 'valor_raspadinha', ' 7.5 ').status_code == 200
+    assert salvar(client, admin, 'min_saque', 20).status_code == 200
+    assert salvar(client, admin, 'pix_enabled', False).status_code == 200
+    assert salvar(client, admin, 'tabela_premios', {**TABELA_PREMIOS_PADRAO, 'chance_extra': 0.1}).status_code == 200
+    
+    assert configuracoes.obter('valor_raspadinha') == Decimal('7.50')
+    assert configuracoes.obter('min_saque') == Decimal('20.00')
+    assert configuracoes.obter('pix_enabled') is False
+    assert carregar_tabela_premios().chance_extra == 0.1
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from src.models.user import db, PartnerCoupon, PartnerCouponUsageShard, User
+from src.services import cupons
+
+
+def cadastrar(client, email, codigo):
+    return client.post('/api/auth/register', json={
+        'nome': 'Novo', 'email': email, 'telefone': '(11) 98888-7777',
+        'password': 'senha123', 'referral_code_input': codigo,
+    })
+
+
+def test_cadastro_com_cupom_registra_uso(client):
+    db.session.add(PartnerCoupon(code='PARCEIRO', partner_name='Parceiro'))
+    db.session.commit()
+    assert cadastrar(client, 'a@teste.com', 'PARCEIRO').status_code == 201
+    cupom = PartnerCoupon.query.filter_by(code='PARCEIRO').one()
+    assert User.query.filter_by(email='a@teste.com').one().partner_coupon_id == cupom.id
+    assert cupom.total_usos == 1
+
+
+def test_cupom_excluido_em_outro_worker_nao_quebra_o_cadastro(client):
+    cupom = PartnerCoupon(code='PARCEIRO', partner_name='Parceiro')
+    db.session.add(cupom)
+    db.session.commit()
+    assert cupons.buscar_cupom_ativo('PARCEIRO') == cupom.id
+    # Excluído sem passar por este worker: o índice em cache continua com o cupom
+    PartnerCouponUsageShard.query.delete()
+    db.session.delete(cupom)
+    db.session.commit()
+    
+    resposta = cadastrar(client, 'b@teste.com', 'PARCEIRO')
+    assert resposta.status_code == 201
+    assert User.query.filter_by(email='b@teste.com').one().partner_coupon_id is None
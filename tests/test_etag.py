@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from conftest import solicitar_saque
+
+
+def revalidar(client, url, headers, etag):
+    return client.get(url, headers={**headers, 'If-None-Match': etag})
+
+
+def test_mesmo_etag_devolve_304_e_outro_devolve_o_corpo(client, criar_usuario):
+    _, headers = criar_usuario()
+    primeira = client.get('/api/auth/profile', headers=headers)
+    assert primeira.status_code == 200
+    assert primeira.headers['Cache-Control'] == 'private, no-cache'
+    etag = primeira.headers['ETag']
+    
+    repetida = revalidar(client, '/api/auth/profile', headers, etag)
+    assert repetida.status_code == 304
+    assert repetida.headers['ETag'] == etag
+    assert repetida.get_data() == b''
+    
+    outra = revalidar(client, '/api/auth/profile', headers, '"etag-antigo"')
+    assert outra.status_code == 200
+    assert outra.get_json() == primeira.get_json()
+
+
+def test_etag_muda_depois_de_uma_escrita(client, criar_usuario, admin):
+    _, headers = criar_usuario(saldo=100)
+    etags = {url: client.get(url, headers=headers).headers['ETag']
+             for url in ('/api/auth/profile', '/api/jogos/historico', '/api/jogos/saques')}
+    
+    saque_id = solicitar_saque(client, headers, 10)
+    # Saque: muda o saldo (perfil) e os saques, mas não o histórico
+    assert revalidar(client, '/api/auth/profile', headers, etags['/api/auth/profile']).status_code == 200
+    assert revalidar(client, '/api/jogos/historico', headers, etags['/api/jogos/historico']).status_code == 304
+    resposta = client.get('/api/jogos/saques', headers=headers)
+    assert resposta.headers['ETag'] != etags['/api/jogos/saques']
+    etag_saques = resposta.headers['ETag']
+    # Compra: sempre acrescenta um jogo ao histórico (o saldo pode voltar ao
+    # mesmo valor se o prêmio for igual ao preço)
+    client.post('/api/jogos/novo', json={'quantidade_raspadinhas': 1, 'origem_saldo': True}, headers=headers)
+    assert revalidar(client, '/api/jogos/historico', headers, etags['/api/jogos/historico']).status_code == 200
+    assert revalidar(client, '/api/jogos/saques', headers, etag_saques).status_code == 304
+    
+    # Mudança de status feita pelo admin também invalida a listagem do usuário
+    client.put(f'/api/admin/saques/{saque_id}/status', json={'status': 'cancelado'}, headers=admin)
+    resposta = revalidar(client, '/api/jogos/saques', headers, etag_saques)
+    assert resposta.status_code == 200
+    assert resposta.get_json()['saques'][0]['status'] == 'cancelado'
+
+
+def test_relatorios_do_admin_nao_usam_etag(client, admin):
+    for url in ('/api/admin/dashboard', '/api/admin/relatorios/financeiro'):
+        resposta = client.get(url, headers=admin)
+        assert resposta.status_code == 200
+        assert 'ETag' not in resposta.headers
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+
+
+def test_csv_neutraliza_formulas_na_chave_pix(client, criar_usuario, admin):
+    _, headers = criar_usuario(saldo=100)
+    chaves = ['=HYPERLINK("http://exemplo.com")', '+5511999999999', '-1+1', '@SUM(A1)', 'pix@teste.com']
+    for chave in chaves:
+        resposta = client.post('/api/jogos/solicitar-saque', json={'valor': 5, 'chave_pix': chave}, headers=headers)
+        assert resposta.status_code == 201
+    
+    resposta = client.get('/api/admin/saques/exportar', query_string={'formato': 'csv'}, headers=admin)
+    linhas = list(csv.DictReader(io.StringIO(resposta.get_data(as_text=True))))
+    assert [linha['chave_pix'] for linha in linhas] == ["'" + c for c in chaves[:4]] + ['pix@teste.com']
+    assert [linha['valor'] for linha in linhas] == ['5.0'] * 5
+    
+    # O NDJSON não é aberto em planilhas e mantém o valor original
+    resposta = client.get('/api/admin/saques/exportar', query_string={'formato': 'ndjson'}, headers=admin)
+    itens = [json.loads(linha) for linha in resposta.get_data(as_text=True).splitlines()]
+    assert [item['chave_pix'] for item in itens] == chaves
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from conftest import saldo_de
+from src.models.user import db, ChaveIdempotencia, Jogo
+from src.services import idempotencia
+
+
+def comprar(client, headers, chave, quantidade=2):
+    return client.post(
+        '/api/jogos/novo',
+        json={'quantidade_raspadinhas': quantidade, 'origem_saldo': True},
+        headers={**headers, 'Idempotency-Key': chave}
+    )
+
+
+def test_repeticao_devolve_a_mesma_resposta_sem_cobrar_de_novo(client, criar_usuario):
+    user_id, headers = criar_usuario(saldo=50)
+    primeira = comprar(client, headers, 'compra-1')
+    assert primeira.status_code == 201
+    assert 'Idempotent-Replayed' not in primeira.headers
+    
+    repetida = comprar(client, headers, 'compra-1')
+    idempotencia._cache.clear()
+    do_banco = comprar(client, headers, 'compra-1')
+    for resposta in (repetida, do_banco):
+        assert resposta.status_code == 201
+        assert resposta.headers['Idempotent-Replayed'] == 'true'
+        assert resposta.get_json() == primeira.get_json()
+    assert Jogo.query.count() == 1
+    # Cobrado uma vez só (o saldo final inclui o prêmio sorteado)
+    assert saldo_de(user_id) == Decimal(str(primeira.get_json()['saldo_atual']))
+
+
+def test_mesma_chave_com_outro_corpo_e_recusada(client, criar_usuario):
+    user_id, headers = criar_usuario(saldo=50)
+    primeira = comprar(client, headers, 'compra-1')
+    assert primeira.status_code == 201
+    for _ in range(2):
+        assert comprar(client, headers, 'compra-1', quantidade=3).status_code == 422
+        idempotencia._cache.clear()
+    assert Jogo.query.count() == 1
+    assert saldo_de(user_id) == Decimal(str(primeira.get_json()['saldo_atual']))
+
+
+def test_erro_libera_a_chave_para_nova_tentativa(client, criar_usuario):
+    _, headers = criar_usuario(saldo=5)
+    assert comprar(client, headers, 'compra-1').status_code == 400
+    headers_com_saldo = criar_usuario('rico@teste.com', saldo=50)[1]
+    assert comprar(client, headers_com_saldo, 'compra-1').status_code == 201
+    assert comprar(client, headers, 'compra-1', quantidade=1).status_code == 201
+
+
+def reservar_pendente(user_id, chave, criado_em):
+    # Reserva deixada por um worker que morreu antes de gravar a resposta
+    db.session.add(ChaveIdempotencia(user_id=user_id, chave=chave, rota='jogos.novo', criado_em=criado_em))
+    db.session.commit()
+
+
+def test_reserva_pendente_recente_responde_409(client, criar_usuario):
+    user_id, headers = criar_usuario(saldo=50)
+    reservar_pendente(user_id, 'compra-1', datetime.utcnow())
+    assert comprar(client, headers, 'compra-1').status_code == 409
+    assert Jogo.query.count() == 0
+
+
+def test_reserva_pendente_vencida_e_assumida(client, criar_usuario):
+    user_id, headers = criar_usuario(saldo=50)
+    reservar_pendente(user_id, 'compra-1', datetime.utcnow() - idempotencia.PRAZO_RESERVA - timedelta(seconds=1))
+    primeira = comprar(client, headers, 'compra-1')
+    assert primeira.status_code == 201
+    repetida = comprar(client, headers, 'compra-1')
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert repetida.get_json() == primeira.get_json()
+    assert Jogo.query.count() == 1
+
+
+def test_chave_expirada_no_cache_nao_e_reaproveitada(client, criar_usuario, monkeypatch):
+    _, headers = criar_usuario(saldo=50)
+    assert comprar(client, headers, 'compra-1').status_code == 201
+    monkeypatch.setattr(idempotencia, 'VALIDADE_CHAVE', timedelta(0))
+    resposta = comprar(client, headers, 'compra-1')
+    assert resposta.status_code == 201
+    assert 'Idempotent-Replayed' not in resposta.headers
+    assert Jogo.query.count() == 2
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import os
+
+from src.services import metricas
+
+
+def test_coletor_usa_o_token_e_as_series_levam_o_worker(client, criar_usuario, monkeypatch):
+    _, headers = criar_usuario()
+    monkeypatch.setattr(metricas, 'METRICAS_TOKEN', 'segredo-do-coletor')
+    client.get('/api/auth/profile', headers=headers)
+    
+    assert client.get('/api/admin/metricas').status_code == 401
+    assert client.get('/api/admin/metricas', headers={'Authorization': 'Bearer outro'}).status_code == 401
+    assert client.get('/api/admin/metricas', headers=headers).status_code == 403
+    
+    resposta = client.get('/api/admin/metricas', headers={'Authorization': 'Bearer segredo-do-coletor'})
+    assert resposta.status_code == 200
+    texto = resposta.get_data(as_text=True)
+    assert f'raspadinha_db_time_seconds_total{{endpoint="auth.get_profile",worker="{os.getpid()}"}}' in texto
+
+
+def test_admin_continua_acessando_sem_token_configurado(client, admin):
+    assert metricas.METRICAS_TOKEN == ''
+    assert client.get('/api/admin/metricas', headers=admin).status_code == 200
+    assert client.get('/api/admin/metricas', headers={'Authorization': 'Bearer '}).status_code == 401
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+from src.models.user import db, Jogo
+
+
+def criar_jogos(user_id, datas):
+    for data in datas:
+        db.session.add(Jogo(user_id=user_id, quantidade_raspadinhas=1, valor_total=5, premio_total=0, data_jogo=data))
+    db.session.commit()
+
+
+def test_paginas_nao_repetem_nem_pulam_jogos_com_datas_iguais(client, criar_usuario):
+    user_id, headers = criar_usuario()
+    agora = datetime(2025, 1, 1, 12, 0, 0)
+    # Vários jogos no mesmo instante, cortados no meio de uma página
+    criar_jogos(user_id, [agora] * 5 + [agora - timedelta(minutes=1)] * 3 + [agora + timedelta(minutes=1)])
+    
+    vistos, cursor = [], None
+    while True:
+        params = {'limite': 2, 'detalhes': 'false'}
+        if cursor:
+            params['cursor'] = cursor
+        resposta = client.get('/api/jogos/historico', query_string=params, headers=headers)
+        assert resposta.status_code == 200
+        dados = resposta.get_json()
+        vistos += [(j['data_jogo'], j['id']) for j in dados['jogos']]
+        cursor = dados['proximo_cursor']
+        if not cursor:
+            break
+    
+    esperado = [(j.data_jogo.isoformat(' '), j.id) for j in Jogo.query.order_by(Jogo.data_jogo.desc(), Jogo.id.desc())]
+    assert vistos == esperado
+    assert len(vistos) == 9
+
+
+def test_cursor_invalido(client, criar_usuario):
+    _, headers = criar_usuario()
+    for cursor in ('nao-e-base64!', 'bGl4bw', 'MjAyNS0wMS0wMXx4'):
+        resposta = client.get('/api/jogos/historico', query_string={'cursor': cursor}, headers=headers)
+        assert resposta.status_code == 400
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+import pytest
+
+from src.services import resultado_compacto
+
+
+@pytest.mark.parametrize('premios, extras', [
+    ([Decimal('0.00')], [False]),
+    ([Decimal('5.00'), Decimal('0.00'), Decimal('500.00')], [True, False, True]),
+    (
+        [Decimal(str(v)) for v in ('0.00', '5.00', '10.00', '0.00', '100.00') * 20],
+        [i % 3 == 0 for i in range(100)],
+    ),
+])
+def test_codificar_e_decodificar(premios, extras):
+    dados = resultado_compacto.codificar(premios, extras)
+    assert resultado_compacto.decodificar(dados) == list(zip(premios, extras))
+
+
+def test_maximo_de_raspadinhas_ocupa_poucos_bytes():
+    premios = [Decimal('0.00')] * 99 + [Decimal('1234.56')]
+    extras = [False] * 99 + [True]
+    dados = resultado_compacto.codificar(premios, extras)
+    # Cabeçalho + 2 prêmios distintos + n + 100 índices + 13 bytes de bitmap
+    assert len(dados) == 2 + 2 * 4 + 2 + 100 + 13
+    assert resultado_compacto.decodificar(dados)[-1] == (Decimal('1234.56'), True)
+
+
+def test_versao_desconhecida():
+    dados = bytearray(resultado_compacto.codificar([Decimal('5.00')], [False]))
+    dados[0] = resultado_compacto.VERSAO + 1
+    with pytest.raises(ValueError):
+        resultado_compacto.decodificar(bytes(dados))
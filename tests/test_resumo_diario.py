@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from src.models.user import db, Jogo, ResumoDiario
+from src.services import resumo_diario
+
+
+def jogos_anteriores_ao_deploy(user_id, quantidade, data):
+    # Gravados sem passar por resumo_diario.registrar
+    for _ in range(quantidade):
+        db.session.add(Jogo(user_id=user_id, quantidade_raspadinhas=1, valor_total=5, premio_total=0, data_jogo=data))
+    db.session.commit()
+
+
+def test_compra_antes_do_primeiro_relatorio_nao_esconde_o_historico(client, criar_usuario, admin):
+    user_id, headers = criar_usuario(saldo=100)
+    jogos_anteriores_ao_deploy(user_id, 5, datetime.utcnow() - timedelta(days=2))
+    resposta = client.post('/api/jogos/novo', json={'quantidade_raspadinhas': 1, 'origem_saldo': True}, headers=headers)
+    assert resposta.status_code == 201
+    assert not resumo_diario.calculado()
+    
+    relatorio = client.get('/api/admin/relatorios/financeiro', headers=admin).get_json()
+    assert relatorio['operacional']['quantidade_jogos'] == 6
+    assert relatorio['financeiro']['total_arrecadado'] == 30.0
+    dashboard = client.get('/api/admin/dashboard', headers=admin).get_json()
+    assert dashboard['total_jogos'] == dashboard['jogos_7d'] == 6
+    assert resumo_diario.calculado()
+
+
+def test_recalcular_soma_so_a_diferenca(client, criar_usuario):
+    user_id, headers = criar_usuario(saldo=100)
+    ontem = datetime.utcnow() - timedelta(days=1)
+    jogos_anteriores_ao_deploy(user_id, 2, ontem)
+    client.post('/api/jogos/novo', json={'quantidade_raspadinhas': 2, 'origem_saldo': True}, headers=headers)
+    client.post('/api/jogos/solicitar-saque', json={'valor': 10, 'chave_pix': 'chave'}, headers=headers)
+    # Resumo desatualizado: dia sem movimentação nas tabelas de origem
+    zerado = {c: 0 for c in resumo_diario.CAMPOS}
+    db.session.add(ResumoDiario(dia=ontem.date() - timedelta(days=5), shard=2, **{**zerado, 'quantidade_jogos': 7}))
+    db.session.commit()
+    
+    for _ in range(2):
+        resumo_diario.recalcular()
+        db.session.commit()
+        totais = resumo_diario.somar(ontem.date() - timedelta(days=30), datetime.utcnow().date() + timedelta(days=1))
+        assert totais['quantidade_jogos'] == 3
+        assert totais['quantidade_raspadinhas'] == 4
+        assert totais['total_arrecadado'] == Decimal('20.00')
+        assert totais['saques_solicitados'] == Decimal('10.00')
+        assert totais['novos_usuarios'] == 1
+
+
+def test_recalcular_um_intervalo_nao_marca_o_historico(client, criar_usuario):
+    user_id, _ = criar_usuario()
+    ontem = datetime.utcnow() - timedelta(days=1)
+    jogos_anteriores_ao_deploy(user_id, 3, ontem)
+    resumo_diario.recalcular(ontem.date(), ontem.date() + timedelta(days=1))
+    db.session.commit()
+    assert resumo_diario.somar(ontem.date(), ontem.date() + timedelta(days=1))['quantidade_jogos'] == 3
+    assert not resumo_diario.calculado()
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+from conftest import saldo_de
+from src.models.user import db, Movimentacao
+from src.services.saldo import creditar, debitar
+
+
+def test_debito_com_saldo_insuficiente_nao_altera_nada(criar_usuario):
+    user_id, _ = criar_usuario(saldo=10)
+    assert debitar(user_id, Decimal('10.01'), 'compra') is None
+    db.session.commit()
+    assert saldo_de(user_id) == Decimal('10.00')
+    assert Movimentacao.query.count() == 0
+
+
+def test_debito_e_credito_registram_extrato(criar_usuario):
+    user_id, _ = criar_usuario(saldo=10)
+    assert debitar(user_id, Decimal('4'), 'compra', 'jogo:1') == Decimal('6.00')
+    assert creditar(user_id, Decimal('1.5'), 'premio', 'jogo:1') == Decimal('7.50')
+    db.session.commit()
+    assert saldo_de(user_id) == Decimal('7.50')
+    extrato = [(m.tipo, m.valor, m.saldo_apos) for m in Movimentacao.query.order_by(Movimentacao.id)]
+    assert extrato == [('compra', Decimal('-4.00'), Decimal('6.00')), ('premio', Decimal('1.50'), Decimal('7.50'))]
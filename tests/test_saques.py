@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+import pytest
+
+from conftest import saldo_de
+from src.models.user import Saque
+
+
+@pytest.mark.parametrize('valor', ['NaN', 'Infinity', '-Infinity', 'abc', '-5', 0])
+def test_rejeita_valor_invalido(client, criar_usuario, valor):
+    user_id, headers = criar_usuario(saldo=50)
+    resposta = client.post('/api/jogos/solicitar-saque', json={'valor': valor, 'chave_pix': 'chave'}, headers=headers)
+    assert resposta.status_code == 400
+    assert saldo_de(user_id) == Decimal('50.00')
+    assert Saque.query.count() == 0
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Transições de saques em lote e os estornos lançados um a um no extrato"""
+
+from decimal import Decimal
+
+from conftest import estornos, saldo_de, solicitar_saque
+from src.models.user import db, Movimentacao, Saque
+from src.services import estatisticas
+from src.services.saldo import creditar_em_lote
+
+
+def test_lote_so_altera_status_de_origem_permitidos(client, criar_usuario, admin):
+    user_id, headers = criar_usuario(saldo=100)
+    ids = [solicitar_saque(client, headers, valor) for valor in (10, 20, 30)]
+    db.session.get(Saque, ids[1]).status = 'processando'
+    db.session.get(Saque, ids[2]).status = 'concluido'
+    db.session.commit()
+    
+    for filtro in ({'status': 'processando'}, {'status': 'concluido'}, {'user_id': user_id}):
+        resposta = client.put('/api/admin/saques/status', json={'status': 'cancelado', 'filtro': filtro}, headers=admin)
+        assert resposta.status_code == 200
+    
+    db.session.expire_all()
+    assert [db.session.get(Saque, i).status for i in ids] == ['cancelado', 'processando', 'concluido']
+    assert saldo_de(user_id) == Decimal('50.00')
+    assert estornos() == [f'saque:{ids[0]}']
+    assert estatisticas.ler()['saques_pendentes'] == 0
+
+
+def test_credito_em_lote_lanca_cada_item_com_sua_referencia(criar_usuario):
+    a, _ = criar_usuario('a@teste.com', saldo=0)
+    b, _ = criar_usuario('b@teste.com', saldo=5)
+    novos = creditar_em_lote([(a, 1, 'saque:1'), (b, 2, 'saque:2'), (a, 3, 'saque:3')], 'estorno_saque')
+    db.session.commit()
+    assert novos == {a: Decimal('4.00'), b: Decimal('7.00')}
+    extrato = [(m.user_id, m.referencia, m.saldo_apos) for m in Movimentacao.query.order_by(Movimentacao.id)]
+    assert extrato == [(a, 'saque:1', Decimal('1.00')), (b, 'saque:2', Decimal('7.00')), (a, 'saque:3', Decimal('4.00'))]
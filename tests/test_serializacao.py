@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Os planos das listagens devem gerar a mesma saída dos to_dict() dos modelos"""
+
+from datetime import datetime
+
+from sqlalchemy import select
+
+from src.models.user import db, Jogo, Raspadinha, Saque, User
+from src.services import serializacao
+
+
+def linhas(plano, modelo):
+    return plano.linhas(db.session.execute(select(*plano.colunas).order_by(modelo.id)).all())
+
+
+def test_planos_iguais_aos_to_dict(client, criar_usuario):
+    _, headers = criar_usuario(saldo=100)
+    criar_usuario('sem-login@teste.com', saldo=0)
+    db.session.get(User, 1).ultimo_login = datetime.utcnow()
+    db.session.commit()
+    for quantidade in (1, 3):
+        client.post('/api/jogos/novo', json={'quantidade_raspadinhas': quantidade, 'origem_saldo': True}, headers=headers)
+    saque = client.post('/api/jogos/solicitar-saque', json={'valor': 5, 'chave_pix': 'chave'}, headers=headers).get_json()['saque']
+    client.post('/api/jogos/solicitar-saque', json={'valor': 6, 'chave_pix': 'chave'}, headers=headers)
+    db.session.get(Saque, saque['id']).data_processamento = datetime.utcnow()
+    db.session.commit()
+    db.session.expire_all()
+    
+    assert linhas(serializacao.PLANO_USUARIO, User) == [u.to_dict() for u in User.query.order_by(User.id)]
+    assert linhas(serializacao.PLANO_SAQUE, Saque) == [s.to_dict() for s in Saque.query.order_by(Saque.id)]
+    assert linhas(serializacao.PLANO_RASPADINHA, Raspadinha) == [r.to_dict() for r in Raspadinha.query.order_by(Raspadinha.id)]
+    
+    jogos = Jogo.query.order_by(Jogo.id).all()
+    rows = db.session.execute(select(*serializacao.COLUNAS_JOGO_DETALHES).order_by(Jogo.id)).all()
+    assert len(jogos) == 2
+    assert serializacao.jogos(rows, incluir_raspadinhas=False) == [j.to_dict(incluir_raspadinhas=False) for j in jogos]
+    assert serializacao.jogos(rows) == [j.to_dict() for j in jogos]
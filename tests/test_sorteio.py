@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""A semente guardada no jogo deve reproduzir o mesmo sorteio"""
+
+from src.services.sorteio import carregar_tabela_premios, montar_tabela, sortear_raspadinhas
+
+TABELA_COM_EXTRAS = montar_tabela({
+    'premios': ['0.00', '5.00', '10.00', '100.00'],
+    'pesos': [50, 30, 15, 5],
+    'chance_extra': 0.3,
+})
+
+
+def test_mesma_semente_mesmo_sorteio():
+    sorteio = sortear_raspadinhas(100, TABELA_COM_EXTRAS, semente=12345)
+    assert sortear_raspadinhas(100, TABELA_COM_EXTRAS, semente=12345) == sorteio
+    assert sortear_raspadinhas(100, TABELA_COM_EXTRAS, semente=12346) != sorteio
+    assert any(sorteio.extras)
+    assert sorteio.premio_total == sum(sorteio.premios)
+
+
+def test_semente_do_jogo_reproduz_raspadinhas(client, criar_usuario):
+    _, headers = criar_usuario(saldo=100)
+    jogo = client.post('/api/jogos/novo', json={'quantidade_raspadinhas': 10, 'origem_saldo': True}, headers=headers).get_json()['jogo']
+
+    sorteio = sortear_raspadinhas(10, carregar_tabela_premios(), semente=int(jogo['semente']))
+    assert [r['premio'] for r in jogo['raspadinhas']] == [float(p) for p in sorteio.premios]
+    assert [r['extra'] for r in jogo['raspadinhas']] == sorteio.extras
+    assert jogo['premio_total'] == float(sorteio.premio_total)
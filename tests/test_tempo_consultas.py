@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import pytest
+from sqlalchemy import exc, text
+
+from src.models.user import db
+from src.services import tempo_consultas
+
+
+@pytest.fixture
+def medidas():
+    """SQL das consultas medidas durante o teste"""
+    lista = []
+    assinante = lambda duracao, sql: lista.append(sql)
+    tempo_consultas.assinar(assinante)
+    yield lista
+    tempo_consultas.cancelar(assinante)
+
+
+def test_consulta_com_erro_nao_deixa_inicio_na_pilha(app, medidas):
+    with db.engine.connect() as conexao:
+        with pytest.raises(exc.OperationalError):
+            conexao.execute(text('SELECT * FROM tabela_que_nao_existe'))
+        assert not conexao.info.get(tempo_consultas.CHAVE)
+        conexao.execute(text('SELECT 1'))
+        assert not conexao.info.get(tempo_consultas.CHAVE)
+    assert medidas == ['SELECT 1']
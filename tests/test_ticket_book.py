@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from src.models.user import db, TicketBook
+from src.services.sorteio import carregar_tabela_premios
+from src.services.ticket_book import criar_livro, reservar_bilhetes
+
+
+def test_reserva_sobrevive_ao_rollback_da_compra(app):
+    livro = criar_livro(20, carregar_tabela_premios())
+    db.session.commit()
+    
+    livro_id, inicio, sorteio = reservar_bilhetes(5)
+    assert (livro_id, inicio, len(sorteio.premios)) == (livro.id, 0, 5)
+    db.session.rollback()
+    
+    # Os bilhetes da compra desfeita são descartados, não vendidos de novo
+    assert reservar_bilhetes(5)[1] == 5
+    assert db.session.get(TicketBook, livro.id).cursor == 10
+    assert reservar_bilhetes(11) is None
+
+
+def test_compra_usa_o_livro_ativo(client, criar_usuario):
+    livro = criar_livro(20, carregar_tabela_premios())
+    db.session.commit()
+    _, headers = criar_usuario(saldo=100)
+    
+    jogo = client.post('/api/jogos/novo', json={'quantidade_raspadinhas': 3, 'origem_saldo': True}, headers=headers).get_json()['jogo']
+    assert jogo['ticket_book_id'] == livro.id
+    db.session.expire_all()
+    assert db.session.get(TicketBook, livro.id).cursor == 3
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Transições de status dos saques e o worker de pagamentos"""
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from conftest import estornos, saldo_de, solicitar_saque
+from src.models.user import db, Saque
+from src.services import estatisticas, saques
+from src.services.pagamentos import BackendPagamentoFalso, ErroPagamento
+
+
+def test_cancelamento_estorna_uma_unica_vez(client, criar_usuario, admin):
+    user_id, headers = criar_usuario(saldo=50)
+    saque_id = solicitar_saque(client, headers, 20)
+    assert saldo_de(user_id) == Decimal('30.00')
+    
+    for _ in range(2):
+        resposta = client.put(f'/api/admin/saques/{saque_id}/status', json={'status': 'cancelado'}, headers=admin)
+        assert resposta.status_code == 200
+    assert saldo_de(user_id) == Decimal('50.00')
+    assert estornos() == [f'saque:{saque_id}']
+
+
+@pytest.mark.parametrize('status', ['processando', 'concluido'])
+def test_nao_cancela_saque_pago_ou_em_pagamento(client, criar_usuario, admin, status):
+    user_id, headers = criar_usuario(saldo=50)
+    saque_id = solicitar_saque(client, headers, 20)
+    db.session.get(Saque, saque_id).status = status
+    db.session.commit()
+    
+    resposta = client.put(f'/api/admin/saques/{saque_id}/status', json={'status': 'cancelado'}, headers=admin)
+    assert resposta.status_code == 400
+    assert saldo_de(user_id) == Decimal('30.00')
+    assert estornos() == []
+
+
+def test_cancelado_nao_volta_para_a_fila(client, criar_usuario, admin):
+    _, headers = criar_usuario(saldo=50)
+    saque_id = solicitar_saque(client, headers, 20)
+    client.put(f'/api/admin/saques/{saque_id}/status', json={'status': 'cancelado'}, headers=admin)
+    resposta = client.put(f'/api/admin/saques/{saque_id}/status', json={'status': 'pendente'}, headers=admin)
+    assert resposta.status_code == 400
+
+
+class BackendComFalha:
+    def pagar(self, saque):
+        raise ErroPagamento('recusado pelo banco')
+
+
+def test_worker_conclui_saques_pagos(client, criar_usuario):
+    _, headers = criar_usuario(saldo=100)
+    ids = [solicitar_saque(client, headers, valor) for valor in (10, 20)]
+    backend = BackendPagamentoFalso(taxa_falha=0)
+    
+    assert saques.processar_lote(backend) == (2, 0)
+    assert backend.pagos == ids
+    db.session.expire_all()
+    for saque in Saque.query.all():
+        assert saque.status == 'concluido'
+        assert saque.data_processamento is not None
+        assert saque.bloqueado_ate is None
+    assert estatisticas.ler()['saques_pendentes'] == 0
+    assert saques.processar_lote(backend) == (0, 0)
+
+
+def test_worker_devolve_para_a_fila_com_espera_quando_pagamento_falha(client, criar_usuario):
+    user_id, headers = criar_usuario(saldo=100)
+    saque_id = solicitar_saque(client, headers, 10)
+    
+    assert saques.processar_lote(BackendComFalha()) == (0, 1)
+    db.session.expire_all()
+    saque = db.session.get(Saque, saque_id)
+    assert saque.status == 'pendente'
+    assert saque.tentativas == 1
+    assert saque.ultimo_erro == 'recusado pelo banco'
+    assert saque.bloqueado_ate > datetime.utcnow()
+    assert estatisticas.ler()['saques_pendentes'] == 1
+    assert saldo_de(user_id) == Decimal('90.00')
+    # Ainda em espera: não é reivindicado de novo
+    assert saques.processar_lote(BackendPagamentoFalso(taxa_falha=0)) == (0, 0)
+
+
+def test_worker_ignora_saque_alterado_durante_o_pagamento(client, criar_usuario):
+    _, headers = criar_usuario(saldo=100)
+    saque_id = solicitar_saque(client, headers, 10)
+    
+    class BackendConcorrente:
+        def pagar(self, saque):
+            # Outra transação conclui o saque enquanto o pagamento acontece
+            db.session.execute(db.update(Saque).where(Saque.id == saque.id).values(status='concluido'))
+            db.session.commit()
+            raise ErroPagamento('tempo esgotado')
+    
+    assert saques.processar_lote(BackendConcorrente()) == (0, 0)
+    db.session.expire_all()
+    assert db.session.get(Saque, saque_id).status == 'concluido'
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker que processa a fila de saques pendentes em lotes.
+
+Vários workers podem rodar ao mesmo tempo: cada lote é reivindicado com
+SELECT ... FOR UPDATE SKIP LOCKED, então nenhum saque é pago duas vezes.
+
+Uso: python worker_saques.py [--lote 50] [--intervalo 10] [--uma-vez]
+"""
+
+import argparse
+import time
+from datetime import timedelta
+from init_db import create_app
+from src.models.user import db
+from src.services.pagamentos import carregar_backend
+from src.services.saques import processar_lote
+
+def main():
+    parser = argparse.ArgumentParser(description="Processa saques pendentes")
+    parser.add_argument("--lote", type=int, default=50, help="Saques reivindicados por vez")
+    parser.add_argument("--intervalo", type=float, default=10, help="Segundos de espera com a fila vazia")
+    parser.add_argument("--prazo", type=int, default=600, help="Segundos até um lote abandonado voltar à fila")
+    parser.add_argument("--uma-vez", action="store_true", help="Processa um lote e termina")
+    args = parser.parse_args()
+    
+    app = create_app()
+    backend = carregar_backend()
+    with app.app_context():
+        while True:
+            try:
+                concluidos, falhas = processar_lote(backend, args.lote, timedelta(seconds=args.prazo))
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Erro ao processar lote de saques: {e}")
+                concluidos = falhas = 0
+            if concluidos or falhas:
+                print(f"✓ Lote processado: {concluidos} concluído(s), {falhas} com falha")
+            if args.uma_vez:
+                break
+            if not concluidos and not falhas:
+                time.sleep(args.intervalo)
+
+if __name__ == '__main__':
+    main()